@@ -0,0 +1,278 @@
+import sys
+import time
+
+from collections import deque
+
+import numpy as np
+
+
+class Ledger:
+    """A user's transactions as columnar arrays, oldest first."""
+
+    def __init__(self, stocks, quantities, prices):
+        self.symbols = sorted(set(stocks))
+        index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.codes = np.fromiter(map(index.__getitem__, stocks), dtype=np.intp, count=len(stocks))
+        self.quantity = np.asarray(quantities, dtype=np.float64)
+        self.price = np.asarray(prices, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def analyze(ledger, quotes, cash):
+    """
+    Compute P&L, FIFO and average cost basis, time-weighted return and allocation.
+
+    quotes maps symbol to current price; symbols without one are marked at their
+    last traded price. Everything is computed with array operations over the
+    ledger, grouping rows by symbol with a stable sort instead of per-row loops.
+    """
+    m = len(ledger.symbols)
+    codes, qty, price = ledger.codes, ledger.quantity, ledger.price
+    n = len(codes)
+
+    # group rows by symbol, keeping time order within each symbol; small keys get numpy's radix sort
+    order = np.argsort(codes.astype(np.int16) if m < 2 ** 15 else codes, kind="stable")
+    c, q, p = codes[order], qty[order], price[order]
+    buy = q > 0
+    starts = np.flatnonzero(np.r_[True, c[1:] != c[:-1]])
+    first = np.zeros(n, dtype=bool)
+    first[starts] = True
+
+    # shares held after and before each row
+    held = _segment_cumsum(q, starts)
+    held_before = held - q
+
+    # FIFO: the cost of the first x shares bought is piecewise linear in x, so interpolating the
+    # cumulative (shares, cost) curve of buys prices any sell without matching lots one by one
+    bought = np.where(buy, q, 0.0)
+    cum_bought = np.cumsum(bought)
+    xs = np.r_[0.0, cum_bought[buy]]
+    ys = np.r_[0.0, np.cumsum(np.where(buy, q * p, 0.0))[buy]]
+    offset = np.r_[0.0, np.cumsum(np.bincount(c, weights=bought, minlength=m))[:-1]]
+    sold = np.where(buy, 0.0, -q)
+    sold_after = offset[c] + _segment_cumsum(sold, starts)
+    fifo_cost_sold = np.interp(sold_after, xs, ys) - np.interp(sold_after - sold, xs, ys)
+    realized_fifo = np.bincount(c, weights=np.where(buy, 0.0, sold * p - fifo_cost_sold), minlength=m)
+    basis_fifo = np.bincount(c, weights=np.where(buy, q * p, -fifo_cost_sold), minlength=m)
+
+    # average cost: basis follows b[k] = a[k] * b[k-1] + bought cost, where a sell scales the basis by
+    # shares left over shares held. Solved per run of rows between full liquidations through cumulative
+    # log-products, see _linear_scan
+    scale = np.where(buy | (held_before <= 0), 1.0, held / np.where(held_before > 0, held_before, 1.0))
+    runs = np.flatnonzero(first | np.r_[False, held[:-1] <= 0])
+    basis = _linear_scan(np.where(scale > 0, scale, 1.0), np.where(buy, q * p, 0.0), runs)
+    basis[held <= 0] = 0.0
+    basis_before = np.where(first, 0.0, np.r_[0.0, basis[:-1]])
+    realized_avg = np.bincount(c, weights=np.where(buy, 0.0, sold * p - (basis_before - basis)), minlength=m)
+    ends = np.r_[starts[1:], n] - 1
+    basis_avg = basis[ends]
+
+    # current holdings and market value, marking unquoted symbols at their last trade
+    shares = held[ends]
+    last = p[ends]
+    current = np.array([quotes.get(symbol, last[i]) for i, symbol in enumerate(ledger.symbols)], dtype=np.float64)
+    value = shares * current
+
+    # time-weighted return of the holdings: each trade only reprices its own symbol, so the value just
+    # before a trade is the value after the previous one plus that symbol's move since it last traded
+    gain = np.zeros(n)
+    gain[order] = np.where(first, 0.0, held_before * (p - np.r_[0.0, p[:-1]]))
+    flow = qty * price
+    after = np.cumsum(gain + flow)
+    before = after - flow
+
+    # periods with nothing held have no return, judged by share count since values carry rounding
+    invested = np.cumsum(qty) > 0
+    ratios = np.where(invested[:-1], before[1:] / np.where(invested[:-1], after[:-1], 1.0), 1.0)
+    closing = value.sum() / after[-1] if invested[-1] else 1.0
+    twr = float(np.prod(ratios) * closing - 1)
+
+    total = cash + value.sum()
+    positions = [{
+        "symbol": symbol,
+        "shares": int(shares[i]),
+        "price": float(current[i]),
+        "value": float(value[i]),
+        "allocation": float(value[i] / total) if total else 0.0,
+        "basis_fifo": float(basis_fifo[i]),
+        "basis_avg": float(basis_avg[i]),
+        "realized_fifo": float(realized_fifo[i]),
+        "realized_avg": float(realized_avg[i]),
+        "unrealized_fifo": float(value[i] - basis_fifo[i]),
+        "unrealized_avg": float(value[i] - basis_avg[i])
+    } for i, symbol in enumerate(ledger.symbols)]
+
+    return {
+        "positions": positions,
+        "cash": cash,
+        "value": float(value.sum()),
+        "total": float(total),
+        "cash_allocation": float(cash / total) if total else 0.0,
+        "realized_fifo": float(realized_fifo.sum()),
+        "realized_avg": float(realized_avg.sum()),
+        "unrealized_fifo": float((value - basis_fifo).sum()),
+        "unrealized_avg": float((value - basis_avg).sum()),
+        "twr": twr
+    }
+
+
+def _linear_scan(scale, added, runs, span=600.0):
+    """
+    Solve x[k] = scale[k] * x[k-1] + added[k], restarting from zero at each index in runs.
+
+    With L the running sum of log(scale), x[k] = exp(L[k]) * sum(added[j] * exp(-L[j])).
+    exp(-L) would overflow on long runs, so each run is further cut wherever L falls
+    another span below where it started, and each piece carries in the last value of
+    the one before. Pieces are solved all at once per depth, so the Python loop only
+    runs once per span of decay rather than once per row.
+    """
+    n = len(scale)
+    log = _segment_cumsum(np.log(scale), runs)
+    depth = np.floor(-log / span).astype(np.int64)
+
+    # pieces start at every run start and wherever depth changes
+    run_start = np.zeros(n, dtype=bool)
+    run_start[runs] = True
+    pieces = np.flatnonzero(run_start | np.r_[True, depth[1:] != depth[:-1]])
+    piece = np.cumsum(run_start | np.r_[True, depth[1:] != depth[:-1]]) - 1
+    base = np.where(run_start[pieces], 0.0, log[np.maximum(pieces - 1, 0)])[piece]
+    partial = _segment_cumsum(added * np.exp(base - log), pieces, exact=True)
+    factor = np.exp(log - base)
+
+    x = np.zeros(n)
+    carry = np.zeros(len(pieces))
+    for level in range(int(depth.max()) + 1 if n else 0):
+        # pieces continuing a run carry in the value its previous piece, at a shallower depth, ended on
+        continuing = np.flatnonzero((depth[pieces] == level) & ~run_start[pieces])
+        carry[continuing] = x[pieces[continuing] - 1]
+        rows = depth == level
+        x[rows] = factor[rows] * (carry[piece[rows]] + partial[rows])
+    return x
+
+
+def _segment_cumsum(values, starts, exact=False):
+    """
+    Cumulative sum of values restarting at each index in starts (which must include 0).
+
+    By default a global cumsum is rebased at each start, which is fast but lets a large
+    earlier segment swamp a small later one. With exact, segments are instead laid out as
+    rows of a zero-padded matrix, bucketed by length to powers of two, and summed per row.
+    """
+    if not exact:
+        total = np.cumsum(values)
+        before = np.r_[0.0, total[starts[1:] - 1]]
+        return total - np.repeat(before, np.diff(np.r_[starts, len(values)]))
+
+    n = len(values)
+    out = np.empty(n)
+    lengths = np.diff(np.r_[starts, n])
+    buckets = np.ceil(np.log2(np.maximum(lengths, 1))).astype(np.int64)
+    for bucket in np.unique(buckets):
+        chosen = np.flatnonzero(buckets == bucket)
+        index = starts[chosen, None] + np.arange(1 << bucket)
+        inside = np.arange(1 << bucket) < lengths[chosen, None]
+        block = np.where(inside, values[np.minimum(index, n - 1)], 0.0)
+        out[index[inside]] = np.cumsum(block, axis=1)[inside]
+    return out
+
+
+def analyze_naive(stocks, quantities, prices, quotes, cash):
+    """Row-by-row reference implementation of analyze, for testing and benchmarking."""
+    lots, held, basis_avg, last = {}, {}, {}, {}
+    realized_fifo, realized_avg = {}, {}
+    value_after, ratios, invested = 0.0, 1.0, 0
+
+    for symbol, quantity, price in zip(stocks, quantities, prices):
+        # reprice this symbol's holding since its last trade, then apply the trade
+        value_before = value_after + held.get(symbol, 0) * (price - last.get(symbol, price))
+        if invested > 0:
+            ratios *= value_before / value_after
+        value_after = value_before + quantity * price
+        invested += quantity
+        last[symbol] = price
+
+        queue = lots.setdefault(symbol, deque())
+        shares = held.get(symbol, 0)
+        if quantity > 0:
+            queue.append([quantity, price])
+            basis_avg[symbol] = basis_avg.get(symbol, 0.0) + quantity * price
+        else:
+            # FIFO: consume the oldest lots first
+            left, cost = -quantity, 0.0
+            while left > 0:
+                lot = queue[0]
+                take = min(left, lot[0])
+                cost += take * lot[1]
+                lot[0] -= take
+                left -= take
+                if lot[0] == 0:
+                    queue.popleft()
+            realized_fifo[symbol] = realized_fifo.get(symbol, 0.0) - quantity * price - cost
+
+            # average cost: sold shares leave at the current average
+            sold_basis = basis_avg[symbol] * -quantity / shares
+            basis_avg[symbol] -= sold_basis
+            realized_avg[symbol] = realized_avg.get(symbol, 0.0) - quantity * price - sold_basis
+        held[symbol] = shares + quantity
+
+    value = sum(held[symbol] * quotes.get(symbol, last[symbol]) for symbol in held)
+    if invested > 0:
+        ratios *= value / value_after
+    basis_fifo = sum(lot[0] * lot[1] for queue in lots.values() for lot in queue)
+    return {
+        "value": value,
+        "total": cash + value,
+        "realized_fifo": sum(realized_fifo.values()),
+        "realized_avg": sum(realized_avg.values()),
+        "unrealized_fifo": value - basis_fifo,
+        "unrealized_avg": value - sum(basis_avg.values()),
+        "twr": ratios - 1
+    }
+
+
+def _random_ledger(rows, symbols, seed=0):
+    """Generate a valid ledger of rows trades over symbols, never selling more than is held."""
+    rng = np.random.default_rng(seed)
+    names = [f"S{i:03d}" for i in range(symbols)]
+    prices = 10 + rng.random(symbols) * 100
+    held = np.zeros(symbols, dtype=np.int64)
+    stocks, quantities, paid = [], [], []
+    for code in rng.integers(0, symbols, rows):
+        prices[code] *= np.exp(rng.normal(0, 0.02))
+        if held[code] and rng.random() < 0.4:
+            quantity = -int(rng.integers(1, held[code] + 1))
+        else:
+            quantity = int(rng.integers(1, 100))
+        held[code] += quantity
+        stocks.append(names[code])
+        quantities.append(quantity)
+        paid.append(round(float(prices[code]), 2))
+    return stocks, quantities, paid, {name: float(price) for name, price in zip(names, prices)}
+
+
+if __name__ == "__main__":
+    # python analytics.py [rows] [symbols]: time analyze against the naive loop on a random ledger
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    stocks, quantities, prices, quotes = _random_ledger(rows, symbols)
+
+    def best(fn, repeat=5):
+        """Return fn's result and its fastest wall time over repeat runs."""
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return result, min(times)
+
+    naive, naive_time = best(lambda: analyze_naive(stocks, quantities, prices, quotes, 10000.0))
+    ledger, load_time = best(lambda: Ledger(stocks, quantities, prices))
+    report, vector_time = best(lambda: analyze(ledger, quotes, 10000.0))
+
+    for key, expected in naive.items():
+        assert np.isclose(report[key], expected, rtol=1e-6), (key, report[key], expected)
+    print(f"{rows} rows, {symbols} symbols: naive {naive_time * 1000:.1f} ms, "
+          f"vectorized {vector_time * 1000:.1f} ms (+{load_time * 1000:.1f} ms to build arrays), "
+          f"{naive_time / vector_time:.1f}x")
@@ -0,0 +1,205 @@
+import hashlib
+import json
+
+from flask import Blueprint, Response, jsonify, request, session
+from functools import wraps
+
+from helpers import lookup, lookup_many
+from ledger import parse_date
+from orders import OrderError
+
+
+def api_login_required(f):
+    """Like login_required, but answers 401 rather than redirecting to the login form."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get("user_id") is None:
+            return jsonify(error="login required"), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def conditional(etag, build):
+    """Answer 304 if the client already has etag, else jsonify build() tagged with it."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+
+    # clients may keep the response but must revalidate it before reuse
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def digest(*parts):
+    """Short stable hash of JSON-serializable parts, for ETags."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:20]
+
+
+def whole_number(value):
+    """Return value as an int if JSON sent an integer, raising ValueError for bools, fractions and anything else."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{value!r} is not an integer")
+    return int(value)
+
+
+def place_orders(trader, user_id, data):
+    """Price and execute a basket of orders, returning (JSON body, status)."""
+
+    # expect {"orders": [{"symbol": ..., "side": "buy" or "sell", "shares": ...}, ...], "all_or_nothing": true}
+    if not isinstance(data, dict) or not isinstance(data.get("orders"), list) or not data["orders"]:
+        return {"error": "must provide a list of orders"}, 400
+
+    # ensure every leg is well formed before pricing anything
+    legs = []
+    for order in data["orders"]:
+        try:
+            symbol, side, shares = order["symbol"].upper(), order["side"], whole_number(order["shares"])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return {"error": "each order needs a symbol, side and whole number of shares"}, 400
+        if side not in ("buy", "sell") or shares <= 0:
+            return {"error": "side must be buy or sell and shares a positive integer"}, 400
+        legs.append((symbol, side, shares))
+    atomic = data.get("all_or_nothing", True)
+    if not isinstance(atomic, bool):
+        return {"error": "all_or_nothing must be true or false"}, 400
+
+    # price the whole basket with one batched fetch, trades never use cached prices
+    quotes = lookup_many([symbol for symbol, _, _ in legs], fresh=True)
+
+    # unknown symbols are rejected on their own, or reject the basket if all or nothing
+    priced = [i for i, (symbol, _, _) in enumerate(legs) if quotes[symbol] is not None]
+    results = [(None, "Stock symbol not valid, please try again" if quotes[symbol] is None else "basket contains an invalid symbol")
+               for symbol, _, _ in legs]
+    if priced and (not atomic or len(priced) == len(legs)):
+        executed = trader.execute_batch(user_id, [
+            (legs[i][0], legs[i][2] if legs[i][1] == "buy" else -legs[i][2], quotes[legs[i][0]]["price"]) for i in priced
+        ], atomic=atomic)
+        for i, result in zip(priced, executed):
+            results[i] = result
+
+    return {"orders": [{
+        "symbol": symbol,
+        "side": side,
+        "shares": shares,
+        "price": quotes[symbol]["price"] if quotes[symbol] else None,
+        "filled": transaction_id is not None,
+        "transaction_id": transaction_id,
+        "error": error
+    } for (symbol, side, shares), (transaction_id, error) in zip(legs, results)]}, 200
+
+
+def create_api(trader, ledger, book, load_portfolio, positions_version):
+    """
+    Return the /api/v1 blueprint.
+
+    load_portfolio(user_id) returns (cash, positions version, rows, holdings total) and
+    positions_version(user_id) just the version, which changes with every trade.
+    book is the OrderBook holding limit and stop orders.
+    """
+    api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+    @api.route("/quote/<symbol>")
+    @api_login_required
+    def quote(symbol):
+        """Quote one symbol."""
+        quote = lookup(symbol)
+        if quote is None:
+            return jsonify(error="unknown symbol"), 404
+        return conditional(digest(quote), lambda: quote)
+
+    @api.route("/quotes")
+    @api_login_required
+    def quotes():
+        """Quote comma separated symbols, unknown ones as null."""
+        symbols = [symbol.strip().upper() for symbol in request.args.get("symbols", "").split(",") if symbol.strip()]
+        if not symbols or len(symbols) > 200:
+            return jsonify(error="must provide between 1 and 200 symbols"), 400
+        quotes = lookup_many(symbols)
+        return conditional(digest(quotes), lambda: {"quotes": quotes})
+
+    @api.route("/portfolio")
+    @api_login_required
+    def portfolio():
+        """Holdings valued at current prices, with cash and grand total."""
+        cash, version, rows, total = load_portfolio(session["user_id"])
+
+        # holdings and cash only change with the version, prices with the quotes
+        etag = digest(session["user_id"], version, [(row["stock"], row["price"]) for row in rows])
+        return conditional(etag, lambda: {
+            "cash": cash,
+            "total": cash + total,
+            "positions": [{"symbol": row["stock"], "quantity": row["quantity"], "price": row["price"], "total": row["total"]} for row in rows]
+        })
+
+    @api.route("/history")
+    @api_login_required
+    def history():
+        """One page of transactions, newest first, with the cursor of the next page."""
+        try:
+            filters = {
+                "symbol": request.args.get("symbol"),
+                "start": parse_date(request.args.get("start")),
+                "end": parse_date(request.args.get("end"))
+            }
+            limit = min(max(int(request.args.get("limit", 50)), 1), 500)
+        except ValueError:
+            return jsonify(error="start and end must be YYYY-MM-DD and limit an integer"), 400
+
+        # every trade moves the version, so unchanged version and query mean an unchanged page
+        etag = digest(session["user_id"], positions_version(session["user_id"]), sorted(request.args.items()))
+
+        def page():
+            rows, cursor = ledger.page(session["user_id"], cursor=request.args.get("cursor"), limit=limit, **filters)
+            return {"transactions": rows, "next": cursor}
+
+        try:
+            return conditional(etag, page)
+        except ValueError:
+            return jsonify(error="invalid cursor"), 400
+
+    @api.route("/orders", methods=["POST"])
+    @api_login_required
+    def orders():
+        """Buy and sell a basket of stocks, see place_orders."""
+        body, status = place_orders(trader, session["user_id"], request.get_json(silent=True))
+        return jsonify(body), status
+
+    @api.route("/book")
+    @api_login_required
+    def book_orders():
+        """Limit and stop orders, newest first, only those with ?status= if given."""
+        return jsonify(orders=book.orders(session["user_id"], status=request.args.get("status")))
+
+    @api.route("/book", methods=["POST"])
+    @api_login_required
+    def place():
+        """Rest a limit or stop order until the price crosses it."""
+
+        # expect {"symbol": ..., "side": "buy" or "sell", "type": "limit" or "stop", "shares": ..., "price": ...}
+        data = request.get_json(silent=True)
+        try:
+            symbol, shares, price = data["symbol"].upper(), whole_number(data["shares"]), float(data["price"])
+            side, kind = data["side"], data["type"]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify(error="must provide symbol, side, type, a whole number of shares and price"), 400
+        if lookup(symbol) is None:
+            return jsonify(error="unknown symbol"), 404
+        try:
+            id = book.place(session["user_id"], symbol, side, kind, shares, price)
+        except OrderError as e:
+            return jsonify(error=str(e)), 400
+        return jsonify(id=id, status="open"), 201
+
+    @api.route("/book/<int:order_id>", methods=["DELETE"])
+    @api_login_required
+    def cancel(order_id):
+        """Cancel an open order."""
+        try:
+            book.cancel(session["user_id"], order_id)
+        except OrderError as e:
+            return jsonify(error=str(e)), 404
+        return jsonify(id=order_id, status="cancelled")
+
+    return api
@@ -230,18 +230,43 @@
 # for code in default_exceptions:
 #     app.errorhandler(code)(errorhandler)
 
-from cs50 import SQL
-from flask import Flask, flash, redirect, render_template, request, session, url_for
+import json
+import os
+import time
+
+from flask import Flask, Response, flash, jsonify, redirect, render_template, request, session, stream_with_context, url_for
+from markupsafe import Markup
 from flask_session import Session
-from passlib.apps import custom_app_context as pwd_context
 from tempfile import mkdtemp
-from datetime import datetime
+from werkzeug.middleware.proxy_fix import ProxyFix
+from datetime import datetime, timedelta
 
+from analytics import Ledger, analyze
+from api import create_api, place_orders
+from fragments import FragmentCache
+from auth import HasherBusy, PasswordHasher, RateLimiter, create_context
 from helpers import *
+from live import HubFull, QuoteHub
+from metrics import Metrics, instrument, traced
+from ledger import LedgerReader, parse_date
+from migrations import migrate
+from orders import OrderBook
+from prefetch import QuotePrefetcher
+from prices import INTERVALS, PriceStore
+from repository import Repository, release_connections
+from sessions import SQLiteSessionInterface
+from trades import TradeError, TradeExecutor
+from valuation import ValuationCache
 
 # configure application
 app = Flask(__name__)
 
+# behind a router, such as Heroku's (which sets DYNO), remote_addr is the router's; trust that many
+# X-Forwarded-For hops so rate limits see clients, and never more than really sit in front of the app
+trusted_proxies = int(os.environ.get("TRUSTED_PROXIES", 1 if "DYNO" in os.environ else 0))
+if trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
 # ensure responses aren't cached
 if app.config["DEBUG"]:
     @app.after_request
@@ -253,42 +278,220 @@ if app.config["DEBUG"]:
 
 # custom filter
 app.jinja_env.filters["usd"] = usd
-app.jinja_env.globals.update(usd=usd, lookup=lookup, int=int)
+app.jinja_env.globals.update(usd=usd, int=int)
 
-# configure session to use filesystem (instead of signed cookies)
-app.config["SESSION_FILE_DIR"] = mkdtemp()
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
 app.config["PREFERRED_URL_SCHEME"] = 'https'
 app.config["DEBUG"] = False
-Session(app)
 
-# configure CS50 Library to use SQLite database
-db = SQL("sqlite:///finance.db")
+# compile every template once at startup, and stop checking them for changes outside debug
+app.jinja_env.auto_reload = app.debug
+for name in app.jinja_env.list_templates():
+    app.jinja_env.get_template(name)
+
+# rendered navigation, footer and tables, keyed so they never go stale
+fragments = FragmentCache(maxsize=int(os.environ.get("FRAGMENT_CACHE_SIZE", 1000)))
+app.jinja_env.globals.update(chrome=fragments.template(render_template))
+
+# per-route timings of queries, lookups and templates on /metrics, logging requests slower than SLOW_REQUEST_MS
+instrument(app, Metrics(slow=float(os.environ["SLOW_REQUEST_MS"]) if os.environ.get("SLOW_REQUEST_MS") else None, logger=app.logger))
+
+# configure sessions so any worker can serve any request, see README.md
+session_backend = os.environ.get("SESSION_BACKEND", "sqlite")
+if session_backend == "sqlite":
+    app.session_interface = SQLiteSessionInterface(os.environ.get("SESSION_DB", "sessions.db"))
+elif session_backend == "cookie":
+    # signed cookie carrying the session itself, every worker must share SECRET_KEY
+    if not os.environ.get("SECRET_KEY"):
+        raise RuntimeError("SECRET_KEY must be set when SESSION_BACKEND is cookie")
+    app.secret_key = os.environ["SECRET_KEY"]
+elif session_backend == "filesystem":
+    # private to this process, only works with a single worker
+    app.config["SESSION_FILE_DIR"] = mkdtemp()
+    app.config["SESSION_PERMANENT"] = False
+    app.config["SESSION_TYPE"] = "filesystem"
+    Session(app)
+else:
+    raise RuntimeError(f"unknown SESSION_BACKEND {session_backend}")
+
+# bring finance.db's schema, indexes and pragmas up to date, see migrations.py
+migrate("finance.db")
+
+# users, positions and cash, one sqlite3 connection per thread
+db = Repository("finance.db")
+
+# under gevent, database connections are borrowed per request and handed back to their pools here
+app.teardown_appcontext(lambda exception: release_connections())
+
+# password hashing on a bounded pool, see README.md
+hasher = PasswordHasher(create_context(), workers=int(os.environ.get("HASH_WORKERS", 2)), queue=int(os.environ.get("HASH_QUEUE", 16)))
+
+# login and register attempts allowed per minute, per IP and per username, in bursts of LOGIN_BURST
+auth_limiter = RateLimiter(rate=float(os.environ.get("LOGIN_RATE", 10)) / 60, burst=float(os.environ.get("LOGIN_BURST", 5)))
+
+# cash, ledger and positions change together in one transaction per trade
+trader = TradeExecutor("finance.db")
+
+# paginated and streaming reads of transaction history
+ledger = LedgerReader("finance.db")
+
+# time every trade and history read as a span of the request making it, Repository times its own queries
+trader.execute = traced("trade")(trader.execute)
+trader.execute_batch = traced("trade")(trader.execute_batch)
+trader.fill = traced("trade")(trader.fill)
+ledger.page = traced("db")(ledger.page)
+ledger.columns = traced("db")(ledger.columns)
+
+# valued portfolios per user, adjusted in place by trades and quote updates
+valuations = ValuationCache(ttl=quote_cache.ttl)
+trader.listeners.append(valuations.apply_trades)
+quote_listeners.append(valuations.update_quotes)
+
+# history of every fetched quote, set PRICE_STORE to "" to disable
+prices = None
+if os.environ.get("PRICE_STORE", "prices"):
+    prices = PriceStore(os.environ.get("PRICE_STORE", "prices"))
+    fetch_listeners.append(prices.record)
+
+# open /live streams allowed per worker, each holds a thread unless the worker is gevent, so most threads stay free
+# for other requests; dashboards beyond the limit poll /api/v1/portfolio instead
+worker_class = os.environ.get("WORKER_CLASS", "gthread")
+if worker_class == "gevent":
+    live_streams = int(os.environ.get("WORKER_CONNECTIONS", 1000)) // 2
+elif worker_class == "gthread":
+    live_streams = int(os.environ.get("THREADS", 8)) // 4
+else:
+    live_streams = 0
+
+# one quote loop per worker shared by every live dashboard
+hub = QuoteHub(lookup_many, interval=float(os.environ.get("LIVE_INTERVAL", 5)), limit=int(os.environ.get("LIVE_STREAMS", live_streams)))
+quote_listeners.append(hub.publish)
+
+# keeps quotes of symbols held by active sessions warm, set PREFETCH_INTERVAL to 0 to disable
+prefetcher = None
+prefetch_interval = float(os.environ.get("PREFETCH_INTERVAL", quote_cache.ttl / 2))
+if prefetch_interval > 0:
+    # only quotes that would expire before the next round are fetched, whichever worker refreshed them last
+    prefetcher = QuotePrefetcher(lambda symbols: refresh_many(symbols, margin=prefetch_interval),
+                                 interval=prefetch_interval,
+                                 rate=float(os.environ.get("PREFETCH_RATE", 50)),
+                                 idle=float(os.environ.get("PREFETCH_IDLE", 900)))
+
+def portfolio(user_id):
+    """Return (cash, positions version, rows, holdings total) for user, repricing stale holdings."""
+
+    # get user cash total and positions version
+    cash, version = db.account(user_id)
+
+    # reuse the valued portfolio unless holdings changed since it was built
+    snapshot = valuations.get(user_id, version)
+    if snapshot is None:
+        # pull all positions belonging to user, with cash and version read alongside so a trade committing
+        # in between can't be both in the positions and applied again by its trade listener
+        cash, version, positions = db.holdings(user_id)
+
+        # fetch every quote in one batch rather than one request per holding
+        quotes = lookup_many([symbol for symbol, _ in positions])
+        snapshot = valuations.build(user_id, version, positions,
+            {symbol: quote['price'] if quote else None for symbol, quote in quotes.items()})
+
+    # reprice only holdings whose quotes have expired since
+    else:
+        stale = valuations.stale(snapshot)
+        if stale:
+            valuations.update_quotes(lookup_many(stale))
+
+    return (cash, version) + valuations.read(snapshot)
+
+# resting limit and stop orders, matched as quotes arrive and at least every ORDER_INTERVAL seconds
+book = OrderBook("finance.db", trader, lookup_many, interval=float(os.environ.get("ORDER_INTERVAL", 5)))
+quote_listeners.append(book.publish)
+
+# JSON versions of the pages for scripts and the mobile client
+app.register_blueprint(create_api(trader, ledger, book, portfolio, db.positions_version))
 
 @app.route("/")
 @login_required
 def index():
-    # get user cash total
-    result = db.execute("SELECT cash FROM users WHERE id=:id", id=session["user_id"])
-    cash = result[0]['cash']
+    cash, version, rows, total = portfolio(session["user_id"])
 
-    # pull all transactions belonging to user
-    portfolio = db.execute("SELECT stock, quantity FROM portfolio")
+    # keep this user's holdings warm for the next render
+    if prefetcher is not None:
+        prefetcher.track(session["user_id"], [row["stock"] for row in rows])
 
-    if not portfolio:
+    if not rows:
         return apology("sorry you have no holdings")
 
-    grand_total = cash
+    # table only changes with holdings, cash or prices
+    key = ("portfolio", session["user_id"], version, tuple((row["stock"], row["price"]) for row in rows))
+    table = fragments.get(key, lambda: render_template("_portfolio_table.html", stocks=rows, cash=cash, total=cash + total))
+
+    return render_template("index.html", table=Markup(table), stream=hub.limit > 0, poll=int(hub.interval * 1000))
+
+@app.route("/live")
+@login_required
+def live():
+    """Stream price and total changes of user's holdings as Server-Sent Events."""
+
+    user_id = session["user_id"]
+    throttle = float(os.environ.get("LIVE_THROTTLE", 1))
+    version = db.positions_version(user_id)
+    holdings = dict(db.positions(user_id))
+
+    # every stream this worker can afford is taken, the page falls back to polling
+    try:
+        subscription = hub.subscribe(holdings)
+    except HubFull:
+        return Response("live updates are busy, poll /api/v1/portfolio", status=503, headers={"Retry-After": "60"})
+
+    def events():
+        prices = {}
+        while True:
+            # a comment line now and then lets a closed connection be noticed
+            changed = subscription.wait(15)
+            if not changed:
+                yield ": keepalive\n\n"
+                continue
+
+            # totals would be wrong once holdings change, have the page reload instead
+            cash, current = db.account(user_id)
+            if current != version:
+                yield "event: reload\ndata: {}\n\n"
+                return
+
+            prices.update(changed)
+            update = {
+                "prices": changed,
+                "totals": {symbol: holdings[symbol] * price for symbol, price in changed.items()},
+                "total": cash + sum(holdings[symbol] * price for symbol, price in prices.items())
+            }
+            yield f"event: prices\ndata: {json.dumps(update)}\n\n"
+
+            # changes arriving meanwhile are coalesced into the next event
+            time.sleep(throttle)
+
+    # closed however the stream ends, even if the client leaves before the first event
+    response = Response(stream_with_context(events()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(subscription.close)
+    return response
+
+@app.route("/analytics")
+@login_required
+def analytics():
+    """Show profit and loss, cost basis, returns and allocation."""
+
+    # load user's ledger into columnar arrays
+    stocks, quantities, prices = ledger.columns(session["user_id"])
+    if not stocks:
+        return apology("sorry you have no transactions on record")
+    trades = Ledger(stocks, quantities, prices)
 
-    # determine current price, stock total value and grand total value
-    for stock in portfolio:
-        price = lookup(stock['stock'])['price']
-        total = stock['quantity'] * price
-        stock.update({'price': price, 'total': total})
-        grand_total += total
+    # price current holdings with one batched fetch
+    quotes = lookup_many(db.symbols(session["user_id"]))
+    cash = db.cash(session["user_id"])
 
-    return render_template("index.html", stocks=portfolio, cash=cash, total=grand_total)
+    report = analyze(trades, {symbol: quote["price"] for symbol, quote in quotes.items() if quote}, cash)
+    return render_template("analytics.html", report=report)
 
 @app.route("/buy", methods=["GET", "POST"])
 @login_required
@@ -306,41 +509,18 @@ def buy():
         if int(request.form.get("shares")) <= 0:
             return apology("must provide valid number of shares (integer)")
 
-        # pull quote from yahoo finance
-        quote = lookup(request.form.get("stock"))
+        # pull a fresh quote from yahoo finance, trades never use cached prices
+        quote = lookup(request.form.get("stock"), fresh=True)
 
         # check is valid stock name provided
         if quote == None:
             return apology("Stock symbol not valid, please try again")
 
-        # calculate cost of transaction
-        cost = int(request.form.get("shares")) * quote['price']
-
-        # check if user has enough cash for transaction
-        result = db.execute("SELECT cash FROM users WHERE id=:id", id=session["user_id"])
-        if cost > result[0]["cash"]:
-            return apology("you do not have enough cash for this transaction")
-
-        # update cash amount in users database
-        db.execute("UPDATE users SET cash=cash-:cost WHERE id=:id", cost=cost, id=session["user_id"]);
-
-        # add transaction to transaction database
-        add_transaction = db.execute("INSERT INTO transactions (user_id, stock, quantity, price, date) VALUES (:user_id, :stock, :quantity, :price, :date)",
-            user_id=session["user_id"], stock=quote["symbol"], quantity=int(request.form.get("shares")), price=quote['price'], date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-        # pull number of shares of symbol in portfolio
-        curr_portfolio = db.execute("SELECT quantity FROM portfolio WHERE stock=:stock", stock=quote["symbol"])
-
-        # add to portfolio database
-        # if symbol is new, add to portfolio
-        if not curr_portfolio:
-            db.execute("INSERT INTO portfolio (stock, quantity) VALUES (:stock, :quantity)",
-                stock=quote["symbol"], quantity=int(request.form.get("shares")))
-
-        # if symbol is already in portfolio, update quantity of shares and total
-        else:
-            db.execute("UPDATE portfolio SET quantity=quantity+:quantity WHERE stock=:stock",
-                quantity=int(request.form.get("shares")), stock=quote["symbol"]);
+        # debit cash, record transaction and add to position, provided user has enough cash
+        try:
+            trader.buy(session["user_id"], quote["symbol"], int(request.form.get("shares")), quote['price'])
+        except TradeError as e:
+            return apology(str(e))
 
         return redirect(url_for("index"))
 
@@ -348,18 +528,96 @@ def buy():
     else:
         return render_template("buy.html")
 
+@app.route("/orders", methods=["POST"])
+@login_required
+def orders():
+    """Buy and sell a basket of stocks in one request."""
+
+    body, status = place_orders(trader, session["user_id"], request.get_json(silent=True))
+    return jsonify(body), status
+
 @app.route("/history")
 @login_required
 def history():
-    """Show history of transactions."""
+    """Show history of transactions, one page at a time."""
+
+    def page():
+        rows, cursor = ledger.page(session["user_id"], cursor=request.args.get("cursor"), limit=limit, **filters)
+        return render_template("_history_table.html", stocks=rows), cursor, bool(rows)
+
+    # ensure filters and cursor are valid, a page only changes when a trade moves the positions version
+    try:
+        filters = _history_filters()
+        limit = min(max(int(request.args.get("limit", 50)), 1), 500)
+        key = ("history", session["user_id"], db.positions_version(session["user_id"]), tuple(sorted(request.args.items())))
+        table, cursor, found = fragments.get(key, page)
+    except ValueError:
+        return apology("invalid history filter or page")
+
+    if not found and not request.args:
+        return apology("sorry you have no transactions on record")
 
-    # pull all transactions belonging to user
-    portfolio = db.execute("SELECT stock, quantity, price, date FROM transactions WHERE user_id=:id", id=session["user_id"])
+    # filters carried over to the next page and export links
+    filters = {key: value for key, value in request.args.items() if value and key in ("symbol", "start", "end", "limit")}
 
-    if not portfolio:
-        return apology("sorry you have no transactions on record")
+    return render_template("history.html", table=Markup(table), cursor=cursor, filters=filters)
+
+@app.route("/history/export")
+@login_required
+def export():
+    """Stream history of transactions as CSV or NDJSON."""
+
+    # ensure format and filters are valid
+    try:
+        filters = _history_filters()
+    except ValueError:
+        return apology("invalid history filter")
+    if request.args.get("format", "csv") == "csv":
+        rows, mimetype = ledger.export_csv(session["user_id"], **filters), "text/csv"
+    elif request.args.get("format") == "ndjson":
+        rows, mimetype = ledger.export_ndjson(session["user_id"], **filters), "application/x-ndjson"
+    else:
+        return apology("format must be csv or ndjson")
 
-    return render_template("history.html", stocks=portfolio)
+    # rows are read from the database as the client downloads them
+    extension = "csv" if mimetype == "text/csv" else "ndjson"
+    return Response(rows, mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename=history.{extension}"})
+
+@app.route("/prices/<symbol>")
+@login_required
+def price_history(symbol):
+    """Return recorded prices of symbol as JSON, raw or as OHLC bars."""
+
+    if prices is None:
+        return jsonify(error="price history is disabled"), 404
+
+    # ensure interval and date range are valid, end date is inclusive
+    interval = request.args.get("interval")
+    if interval and interval not in INTERVALS:
+        return jsonify(error=f"interval must be one of {', '.join(INTERVALS)}"), 400
+    try:
+        start, end = parse_date(request.args.get("start")), parse_date(request.args.get("end"))
+        limit = min(max(int(request.args.get("limit", 1000)), 1), 10000)
+    except ValueError:
+        return jsonify(error="start and end must be YYYY-MM-DD and limit an integer"), 400
+    start = datetime(start.year, start.month, start.day).timestamp() if start else None
+    end = (datetime(end.year, end.month, end.day) + timedelta(days=1)).timestamp() if end else None
+
+    # most recent limit points or bars
+    symbol = symbol.upper()
+    if interval:
+        bars = prices.resample(symbol, interval, start, end)[-limit:]
+        return jsonify(symbol=symbol, interval=interval, bars=bars)
+    times, values = prices.range(symbol, start, end)
+    return jsonify(symbol=symbol, prices=[{"time": t, "price": p} for t, p in zip(times[-limit:].tolist(), values[-limit:].tolist())])
+
+def _history_filters():
+    """Return symbol and date range filters from the query string, raising ValueError if malformed."""
+    return {
+        "symbol": request.args.get("symbol"),
+        "start": parse_date(request.args.get("start")),
+        "end": parse_date(request.args.get("end"))
+    }
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -379,30 +637,31 @@ def login():
         elif not request.form.get("password"):
             return apology("must provide password")
 
+        # reject floods before they reach the password hash
+        if not auth_limiter.allow(f"ip:{request.remote_addr}", f"user:{request.form.get('username').lower()}"):
+            return apology("too many login attempts, try again later", 429)
+
         # query database for username
-        rows = db.execute("SELECT * FROM users WHERE username = :username", username=request.form.get("username"))
+        user = db.credentials(request.form.get("username"))
 
         # ensure username exists and password is correct
-        if len(rows) != 1 or not pwd_context.verify(request.form.get("password"), rows[0]["hash"]):
+        try:
+            valid, upgraded = hasher.verify(request.form.get("password"), user[1] if user else None)
+        except HasherBusy:
+            return apology("server busy, try again later", 503)
+        if not valid:
             return apology("invalid username and/or password")
 
-        # remember which user has logged in
-        session["user_id"] = rows[0]["id"]
-
-        # clear portfolio for current user
-        db.execute("DELETE from portfolio")
-
-        # pull all transactions belonging to user and load into portfolio db
-        portfolio = db.execute("SELECT stock, SUM(quantity) AS quantity FROM transactions WHERE user_id=:user_id GROUP BY stock ORDER BY stock", user_id=session["user_id"])
+        # rehash with the current scheme and cost now that the password is known
+        if upgraded:
+            db.set_hash(user[0], upgraded)
 
-        # if portfolio is empty, return to index
-        if portfolio:
-            for stock in portfolio:
-                # calculate current cost of stock
-                symbol = stock['stock']
-                quantity = stock['quantity']
+        # remember which user has logged in
+        session["user_id"] = user[0]
 
-                db.execute("INSERT INTO portfolio (stock, quantity) VALUES (:stock, :quantity)", stock=symbol, quantity=quantity)
+        # start fetching user's quotes in the background so the home page finds them cached
+        if prefetcher is not None:
+            prefetcher.prewarm(user[0], db.symbols(user[0]))
 
         # redirect user to home page
         return redirect(url_for("index"))
@@ -415,6 +674,10 @@ def login():
 def logout():
     """Log user out."""
 
+    # stop refreshing user's quotes
+    if prefetcher is not None and session.get("user_id") is not None:
+        prefetcher.forget(session["user_id"])
+
     # forget any user_id
     session.clear()
 
@@ -467,14 +730,20 @@ def register():
         elif request.form.get("password") != request.form.get("password_confirm"):
             return apology("password and password confirmation must match")
 
-        # hash password
-        hash = pwd_context.hash(request.form.get("password"))
-
-        # add user to database
-        result = db.execute("INSERT INTO users (username, hash) VALUES (:username, :hash)", username=request.form.get("username"), hash=hash)
+        # reject floods before they reach the password hash
+        if not auth_limiter.allow(f"ip:{request.remote_addr}"):
+            return apology("too many attempts, try again later", 429)
 
-        # ensure username is unique
-        if not result:
+        # hash password
+        try:
+            hash = hasher.hash(request.form.get("password"))
+        except HasherBusy:
+            return apology("server busy, try again later", 503)
+
+        # add user to database, ensuring username is unique
+        try:
+            result = db.create_user(request.form.get("username"), hash)
+        except ValueError:
             return apology("username is already registered")
 
         # remember which user has logged in
@@ -503,38 +772,28 @@ def sell():
         if int(request.form.get("shares")) <= 0:
             return apology("must provide valid number of shares (integer)")
 
-        available = db.execute("SELECT quantity FROM portfolio WHERE :stock=stock", stock=request.form.get("stock"))
+        available = db.quantity(session["user_id"], request.form.get("stock").upper())
 
         # check that number of shares being sold does not exceed quantity in portfolio
-        if int(request.form.get("shares")) > available[0]['quantity']:
+        if int(request.form.get("shares")) > available:
             return apology("You may not sell more shares than you currently hold")
 
-        # pull quote from yahoo finance
-        quote = lookup(request.form.get("stock"))
+        # pull a fresh quote from yahoo finance, trades never use cached prices
+        quote = lookup(request.form.get("stock"), fresh=True)
 
         # check is valid stock name provided
         if quote == None:
             return apology("Stock symbol not valid, please try again")
 
-        # calculate cost of transaction
-        cost = int(request.form.get("shares")) * quote['price']
-
-        # update cash amount in users database
-        db.execute("UPDATE users SET cash=cash+:cost WHERE id=:id", cost=cost, id=session["user_id"]);
-
-        # add transaction to transaction database
-        add_transaction = db.execute("INSERT INTO transactions (user_id, stock, quantity, price, date) VALUES (:user_id, :stock, :quantity, :price, :date)",
-            user_id=session["user_id"], stock=quote["symbol"], quantity=-int(request.form.get("shares")), price=quote['price'], date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-        # update quantity of shares and total
-        db.execute("UPDATE portfolio SET quantity=quantity-:quantity WHERE stock=:stock",
-            quantity=int(request.form.get("shares")), stock=quote["symbol"]);
+        # remove from position, credit cash and record transaction, rechecking holdings under the write lock
+        try:
+            trader.sell(session["user_id"], quote["symbol"], int(request.form.get("shares")), quote['price'])
+        except TradeError as e:
+            return apology(str(e))
 
         return redirect(url_for("index"))
 
     # else if user reached route via GET (as by clicking a link or via redirect)
     else:
-        # pull all transactions belonging to user
-        portfolio = db.execute("SELECT stock FROM portfolio")
-
-        return render_template("sell.html", stocks=portfolio)
+        # pull all symbols user holds
+        return render_template("sell.html", symbols=db.symbols(session["user_id"]))
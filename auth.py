@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+# under gevent, threads are greenlets sharing one OS thread, so hash on gevent's pool of real threads
+try:
+    from gevent import monkey
+    if monkey.is_module_patched("threading"):
+        from gevent.threadpool import ThreadPoolExecutor
+except ImportError:
+    pass
+
+
+class HasherBusy(Exception):
+    """Every password hashing slot is taken and the queue is full."""
+
+
+def create_context(environ=os.environ):
+    """
+    Build the CryptContext named by PASSWORD_SCHEMES, first scheme hashing new passwords.
+
+    Hashes in the other schemes, or with different rounds than PASSWORD_ROUNDS,
+    still verify but are flagged for rehashing.
+    """
+    schemes = [scheme.strip() for scheme in environ.get("PASSWORD_SCHEMES", "pbkdf2_sha256,sha512_crypt,sha256_crypt").split(",") if scheme.strip()]
+    settings = {"schemes": schemes, "deprecated": schemes[1:]}
+    if environ.get("PASSWORD_ROUNDS"):
+        rounds = int(environ["PASSWORD_ROUNDS"])
+        settings.update({f"{schemes[0]}__default_rounds": rounds, f"{schemes[0]}__min_rounds": rounds, f"{schemes[0]}__max_rounds": rounds})
+    return CryptContext(**settings)
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords on a small pool of threads.
+
+    At most workers hashes run at once however many requests want one, and at most
+    queue more wait; beyond that HasherBusy is raised rather than tying up a request.
+    """
+
+    def __init__(self, context, workers=2, queue=16):
+        self.context = context
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hasher")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash password with the default scheme."""
+        return self._run(self.context.hash, password)
+
+    def verify(self, password, hash):
+        """
+        Return (matches, new hash or None), the new hash set if hash should be upgraded.
+
+        A missing hash, as for an unknown username, still costs one hash so the
+        response time doesn't give away which usernames exist.
+        """
+        if hash is None:
+            self._run(self.context.dummy_verify)
+            return False, None
+        return self._run(self.context.verify_and_update, password, hash)
+
+
+class RateLimiter:
+    """Token buckets per key, each refilling rate tokens a second up to burst."""
+
+    def __init__(self, rate, burst, maxsize=100000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, *keys):
+        """Take a token from every key's bucket if all have one, returning whether they did."""
+        now = self.clock()
+        with self._lock:
+            levels = []
+            for key in keys:
+                tokens, at = self._buckets.get(key, (self.burst, now))
+                levels.append(min(self.burst, tokens + (now - at) * self.rate))
+            allowed = all(tokens >= 1 for tokens in levels)
+            for key, tokens in zip(keys, levels):
+                self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+                self._buckets.move_to_end(key)
+
+            # forget the least recently seen keys, a full bucket is the same as none
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return allowed
@@ -0,0 +1,46 @@
+import atexit
+import os
+import threading
+
+
+class Background:
+    """
+    A daemon thread running target, started on first use in each process.
+
+    Threads don't survive a fork, so start() starts a new one in any process that
+    hasn't got one yet, calling reset() first so state copied from the parent can
+    be rebuilt. stop() sets stopping and calls wake() so a sleeping target notices.
+    """
+
+    def __init__(self, target, name, wake=None, reset=None):
+        self.target = target
+        self.name = name
+        self.wake = wake
+        self.reset = reset
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        """Start the thread unless this process is already running it."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self.reset is not None:
+                self.reset()
+            self.stopping.clear()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        """Stop the thread, waiting up to timeout for it to finish what it is doing."""
+        self.stopping.set()
+        if self.wake is not None:
+            self.wake()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# repository root, where application.py and the template finance.db live
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# symbols users trade, all priced by the synthetic provider
+SYMBOLS = ["AAPL", "MSFT", "GOOG", "AMZN", "NFLX", "TSLA", "META", "NVDA", "INTC", "AMD",
+           "ORCL", "IBM", "CSCO", "ADBE", "PYPL", "UBER", "SHOP", "SQ", "DIS", "NKE"]
+
+PASSWORD = "benchmark"
+
+# environment for the app under test: deterministic local quotes, no shared caches or background threads
+ENVIRON = {
+    "QUOTE_PROVIDER": "synthetic",
+    "QUOTE_STORE": "",
+    "PRICE_STORE": "",
+    "PREFETCH_INTERVAL": "0",
+    "SESSION_BACKEND": "sqlite",
+    "LOGIN_BURST": "1000000000",
+}
+
+
+def seed(path, users, transactions, holdings, rng):
+    """Create finance.db at path with users, each holding symbols bought over transactions trades."""
+    from auth import create_context
+    from migrations import migrate
+
+    # same users table as the shipped database, then today's schema on top
+    template = sqlite3.connect(os.path.join(ROOT, "finance.db"))
+    schema = template.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='users'").fetchone()[0]
+    template.close()
+    conn = sqlite3.connect(path)
+    conn.execute(schema)
+    conn.commit()
+    conn.close()
+    migrate(path)
+
+    # one hash for everyone, hashing per user would dominate seeding
+    hash = create_context().hash(PASSWORD)
+    start = datetime.now() - timedelta(days=365)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO users (username, hash, cash) VALUES (?, ?, ?)",
+                         ((f"user{i}", hash, 1e9) for i in range(users)))
+        ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+
+        # buys only, so every holding can always be sold from
+        rows, positions = [], {}
+        for user_id in ids:
+            held = rng.sample(SYMBOLS, min(holdings, len(SYMBOLS)))
+            for n in range(max(transactions // users, len(held))):
+                symbol = held[n % len(held)]
+                quantity = rng.randint(100, 1000)
+                date = (start + timedelta(seconds=rng.randrange(365 * 86400))).strftime("%Y-%m-%d %H:%M:%S")
+                rows.append((user_id, symbol, quantity, round(rng.uniform(10, 500), 2), date))
+                positions[user_id, symbol] = positions.get((user_id, symbol), 0) + quantity
+        conn.executemany("INSERT INTO transactions (user_id, stock, quantity, price, date) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO positions (user_id, symbol, quantity) VALUES (?, ?, ?)",
+                         ((user_id, symbol, quantity) for (user_id, symbol), quantity in positions.items()))
+    conn.execute("ANALYZE")
+    conn.close()
+    return {user_id: [symbol for (owner, symbol) in positions if owner == user_id] for user_id in ids}
+
+
+def scenarios(holdings):
+    """Return route name to a function (user index, rng) -> (method, path, form data)."""
+    return {
+        "index": lambda user, rng: ("GET", "/", None),
+        "quote": lambda user, rng: ("POST", "/quote", {"stock": rng.choice(SYMBOLS)}),
+        "buy": lambda user, rng: ("POST", "/buy", {"stock": rng.choice(SYMBOLS), "shares": "1"}),
+        "sell": lambda user, rng: ("POST", "/sell", {"stock": rng.choice(holdings[user]), "shares": "1"}),
+        "history": lambda user, rng: ("GET", "/history", None),
+        "login": lambda user, rng: ("POST", "/login", {"username": f"user{user - 1}", "password": PASSWORD}),
+    }
+
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles in milliseconds."""
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50": round(float(np.percentile(latencies, 50)), 2),
+        "p95": round(float(np.percentile(latencies, 95)), 2),
+        "p99": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+def run_client(holdings, requests, rng):
+    """Drive every scenario through Flask's test client, one request at a time."""
+    import application
+
+    # one logged in client per user, outside the timings
+    clients = {}
+    for user in holdings:
+        clients[user] = application.app.test_client()
+        clients[user].post("/login", data={"username": f"user{user - 1}", "password": PASSWORD})
+
+    results = {}
+    for name, make in scenarios(holdings).items():
+        latencies = []
+        began = time.perf_counter()
+        for n in range(requests):
+            user = list(clients)[n % len(clients)]
+            method, path, data = make(user, rng)
+            start = time.perf_counter()
+            response = clients[user].open(path, method=method, data=data)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: {method} {path} answered {response.status_code}")
+        results[name] = summarize(latencies, time.perf_counter() - began)
+    return results
+
+
+def run_gunicorn(holdings, requests, rng, workers, concurrency, directory):
+    """Drive every scenario through a real gunicorn server with concurrent clients."""
+    import requests as http
+
+    # a free port for the server
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    env = dict(os.environ, PYTHONPATH=ROOT, **ENVIRON)
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-w", str(workers), "--threads", str(concurrency),
+                               "-b", f"127.0.0.1:{port}", "--log-level", "warning", "application:app"],
+                              cwd=directory, env=env)
+    try:
+        # wait for every worker to import the app
+        for _ in range(300):
+            try:
+                http.get(base + "/login", timeout=1)
+                break
+            except http.RequestException:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("gunicorn did not start")
+
+        # one logged in session per user, outside the timings
+        sessions = {}
+        for user in holdings:
+            sessions[user] = http.Session()
+            sessions[user].post(base + "/login", data={"username": f"user{user - 1}", "password": PASSWORD})
+
+        results = {}
+        for name, make in scenarios(holdings).items():
+            def one(n):
+                user = list(sessions)[n % len(sessions)]
+                method, path, data = make(user, random.Random(rng.random()))
+                start = time.perf_counter()
+                response = sessions[user].request(method, base + path, data=data, allow_redirects=False)
+                elapsed = time.perf_counter() - start
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{name}: {method} {path} answered {response.status_code}")
+                return elapsed
+
+            began = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(one, range(requests)))
+            results[name] = summarize(latencies, time.perf_counter() - began)
+
+        # idle keep-alive connections would hold up the graceful shutdown
+        for session in sessions.values():
+            session.close()
+        return results
+    finally:
+        server.terminate()
+        try:
+            server.wait(30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def compare(results, baseline):
+    """Print results beside baseline, with the change in p50 and throughput."""
+    for mode, routes in results.items():
+        for name, now in routes.items():
+            then = baseline.get(mode, {}).get(name)
+            line = f"{mode:9} {name:8} {now['rps']:9.1f} rps  p50 {now['p50']:8.2f}  p95 {now['p95']:8.2f}  p99 {now['p99']:8.2f} ms"
+            if then:
+                line += f"   p50 {(now['p50'] / then['p50'] - 1) * 100:+6.1f}%  rps {(now['rps'] / then['rps'] - 1) * 100:+6.1f}%"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every route against a seeded database and local quotes.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=20000, help="total across all users")
+    parser.add_argument("--holdings", type=int, default=8, help="symbols held per user")
+    parser.add_argument("--requests", type=int, default=500, help="per route and mode")
+    parser.add_argument("--mode", choices=["client", "gunicorn", "both"], default="both")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent gunicorn clients")
+    parser.add_argument("--baseline", default=os.path.join(ROOT, "bench_baseline.json"))
+    parser.add_argument("--save", action="store_true", help="overwrite the baseline with these results")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    os.environ.update(ENVIRON)
+    sys.path.insert(0, ROOT)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # the app opens finance.db and sessions.db relative to its working directory
+        holdings = seed(os.path.join(directory, "finance.db"), args.users, args.transactions, args.holdings, rng)
+        os.chdir(directory)
+
+        results = {}
+        if args.mode in ("client", "both"):
+            results["client"] = run_client(holdings, args.requests, rng)
+        if args.mode in ("gunicorn", "both"):
+            results["gunicorn"] = run_gunicorn(holdings, args.requests, rng, args.workers, args.concurrency, directory)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+    compare(results, baseline)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": {key: value for key, value in vars(args).items() if key not in ("baseline", "save")},
+                       "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
@@ -0,0 +1,225 @@
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from metrics import count
+from repository import Database
+
+
+class QuoteCache:
+    """In-process TTL cache for quotes with LRU eviction and negative caching."""
+
+    def __init__(self, ttl=60, maxsize=1024, negative_ttl=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        """Return (True, quote) for a fresh entry, else (False, None). A cached quote of None is a known bad symbol."""
+        key = symbol.upper()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+
+            # mark as most recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, symbol, quote, ttl=None):
+        """Store quote for symbol, evicting the least recently used entries past maxsize."""
+        if ttl is None:
+            ttl = self.ttl if quote is not None else self.negative_ttl
+        key = symbol.upper()
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, quote)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, symbol=None):
+        """Drop one symbol, or everything if no symbol is given."""
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol.upper(), None)
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries)
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedQuoteStore(Database):
+    """Quote cache shared by every worker process through a WAL-mode SQLite file."""
+
+    def __init__(self, path, ttl=60, negative_ttl=None, timeout=5.0, clock=time.time):
+        super().__init__(path, timeout)
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.clock = clock
+
+    def _setup(self, conn):
+        # sqlite's file locks serialize writers across processes, WAL lets readers proceed meanwhile
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS quotes (
+            symbol TEXT PRIMARY KEY NOT NULL,
+            name TEXT,
+            price REAL,
+            fetched_at REAL NOT NULL
+        )""")
+
+    def get_many(self, symbols):
+        """Return {symbol: (quote, seconds left)} for every symbol with an unexpired entry."""
+        keys = {symbol.upper(): symbol for symbol in symbols}
+        if not keys:
+            return {}
+
+        try:
+            rows = self._connect().execute(
+                f"SELECT symbol, name, price, fetched_at FROM quotes WHERE symbol IN ({','.join('?' * len(keys))})",
+                list(keys)).fetchall()
+        except sqlite3.Error:
+            return {}
+
+        now = self.clock()
+        found = {}
+        for symbol, name, price, fetched_at in rows:
+            # a NULL price is a cached invalid symbol
+            quote = None if price is None else {"name": name, "price": price, "symbol": symbol}
+            left = fetched_at + (self.ttl if quote is not None else self.negative_ttl) - now
+            if left > 0:
+                found[keys[symbol]] = (quote, left)
+        return found
+
+    def get(self, symbol):
+        """Return (True, quote, seconds left) for an unexpired entry, else (False, None, 0)."""
+        found = self.get_many([symbol])
+        if symbol not in found:
+            return False, None, 0
+        return (True,) + found[symbol]
+
+    def set_many(self, quotes):
+        """Store a dict of symbol to quote (or None) in one write transaction."""
+        if not quotes:
+            return
+        now = self.clock()
+        rows = [(symbol.upper(),
+                 quote["name"] if quote else None,
+                 quote["price"] if quote else None,
+                 now) for symbol, quote in quotes.items()]
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO quotes (symbol, name, price, fetched_at) VALUES (?, ?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            # the shared store is an optimization, a locked or broken file must not fail the request
+            pass
+
+    def set(self, symbol, quote):
+        """Store quote for symbol."""
+        self.set_many({symbol: quote})
+
+    def purge(self):
+        """Delete expired entries."""
+        now = self.clock()
+        try:
+            self._connect().execute(
+                "DELETE FROM quotes WHERE fetched_at + CASE WHEN price IS NULL THEN ? ELSE ? END <= ?",
+                (self.negative_ttl, self.ttl, now))
+        except sqlite3.Error:
+            pass
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight call."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the call for key already in flight."""
+        return self.do_many([key], lambda keys: {key: fn()})[key]
+
+    def do_many(self, keys, fn):
+        """Return {key: result} for keys, calling fn(keys not in flight) once and waiting on the rest."""
+        led, waiting = [], {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._inflight.get(key)
+                if call is None:
+                    self._inflight[key] = self._Call()
+                    led.append(key)
+                else:
+                    waiting[key] = call
+            self.calls += len(led)
+            self.coalesced += len(waiting)
+
+        # lookups that waited on another request's fetch, per route on /metrics
+        count("quote_coalesced", len(waiting))
+
+        results = {}
+        if led:
+            calls = [self._inflight[key] for key in led]
+            try:
+                results = fn(led)
+                for key, call in zip(led, calls):
+                    call.result = results.get(key)
+            except BaseException as e:
+                for call in calls:
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in led:
+                        del self._inflight[key]
+                for call in calls:
+                    call.done.set()
+
+        for key, call in waiting.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.result
+
+        return results
+
+    def stats(self):
+        """Return how many calls ran and how many joined one already in flight."""
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._inflight)}
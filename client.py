@@ -0,0 +1,103 @@
+import random
+import threading
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stop calling upstream after repeated failures, then let a single trial call through."""
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """Return True if a call may go upstream now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+
+
+class QuoteClient:
+    """Keep-alive HTTP client for the quote provider with timeouts, retries and a circuit breaker."""
+
+    # worth retrying, anything else is the provider's final answer
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(self, base_url, connect_timeout=2.0, read_timeout=5.0, retries=2,
+                 backoff=0.1, max_backoff=2.0, pool_size=10, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        # one pooled session per client, so TCP and TLS setup is paid once per connection, not per quote
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path, params=None):
+        """GET base_url + path, returning the response or raising requests.RequestException."""
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"quote provider circuit open after {self.breaker.failures} failures")
+            try:
+                response = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+                if response.status_code in self.RETRY_STATUSES:
+                    response.raise_for_status()
+            except requests.RequestException:
+                self.breaker.failure()
+                if attempt >= self.retries:
+                    raise
+            else:
+                self.breaker.success()
+                return response
+
+            # full jitter exponential backoff
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            attempt += 1
+
+    def close(self):
+        self.session.close()
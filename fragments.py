@@ -0,0 +1,43 @@
+import threading
+
+from collections import OrderedDict
+from markupsafe import Markup
+
+from metrics import count
+
+
+class FragmentCache:
+    """
+    Rendered HTML fragments, least recently used evicted first.
+
+    Keys must change whenever a fragment's content would, e.g. by including the
+    user's positions version, so entries never need invalidating.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        """Return the fragment cached under key, calling render() to produce it on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                count("fragment_cache_hits")
+                return self._entries[key]
+        count("fragment_cache_misses")
+
+        # render outside the lock, two requests racing on one key both render
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def template(self, render_template):
+        """Return a Jinja global rendering a partial template once per name and context."""
+        def chrome(name, **context):
+            return Markup(self.get((name, tuple(sorted(context.items()))), lambda: render_template(name, **context)))
+        return chrome
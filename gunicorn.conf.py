@@ -0,0 +1,18 @@
+import os
+
+# gthread (default), gevent or sync, see README.md
+worker_class = os.environ.get("WORKER_CLASS", "gthread")
+
+# gunicorn would only say the worker class failed to load
+if worker_class == "gevent":
+    try:
+        import gevent
+    except ImportError:
+        raise RuntimeError("WORKER_CLASS=gevent needs gevent, pip install -r requirements.txt")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+
+# gthread: requests served at once per worker, each holding a thread
+threads = int(os.environ.get("THREADS", 8))
+
+# gevent: requests served at once per worker, each a greenlet parked while it waits on quotes
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
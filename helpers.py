@@ -1,11 +1,40 @@
 import os
-import requests
-import urllib.parse
-import csv
-import urllib.request
 
+from cache import QuoteCache, SharedQuoteStore, SingleFlight
+from concurrent.futures import ThreadPoolExecutor
 from flask import redirect, render_template, request, session
 from functools import wraps
+from metrics import count, span, traced
+from providers import create_provider
+
+# maximum number of concurrent upstream fetches
+MAX_WORKERS = 8
+
+# shared by every lookup in this worker, so concurrent requests can't multiply fetch threads
+fetch_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="quote-fetch")
+
+# backend chosen by QUOTE_PROVIDER, see providers.create_provider
+provider = create_provider()
+
+# quotes are reused for QUOTE_TTL seconds, unknown symbols for QUOTE_NEGATIVE_TTL seconds
+quote_cache = QuoteCache(ttl=float(os.environ.get("QUOTE_TTL", 60)),
+                         maxsize=int(os.environ.get("QUOTE_CACHE_SIZE", 1024)),
+                         negative_ttl=float(os.environ.get("QUOTE_NEGATIVE_TTL", 300)))
+
+# second level cache shared by all gunicorn workers, set QUOTE_STORE to "" to disable
+quote_store = None
+if os.environ.get("QUOTE_STORE", "quotes.db"):
+    quote_store = SharedQuoteStore(os.environ.get("QUOTE_STORE", "quotes.db"),
+                                   ttl=quote_cache.ttl, negative_ttl=quote_cache.negative_ttl)
+
+# concurrent lookups of the same symbol share one upstream fetch
+inflight = SingleFlight()
+
+# called with {SYMBOL: quote} whenever this worker learns new quotes
+quote_listeners = []
+
+# called with {SYMBOL: quote} only for quotes fetched from the provider, not shared by other workers
+fetch_listeners = []
 
 
 def apology(message, code=400):
@@ -38,52 +67,192 @@ def login_required(f):
     return decorated_function
 
 
-def lookup(symbol):
-    """Look up quote for symbol."""
-
-    # # Contact API
-    # try:
-    #     api_key = os.environ.get("API_KEY")
-    #     response = requests.get(f"https://cloud-sse.iexapis.com/stable/stock/{urllib.parse.quote_plus(symbol)}/quote?token={api_key}")
-    #     response.raise_for_status()
-    # except requests.RequestException:
-    #     return None
+@traced("lookup")
+def lookup(symbol, fresh=False):
+    """Look up quote for symbol, from the cache unless fresh is set."""
 
-# reject symbol if it starts with caret
-    if symbol.startswith("^"):
+    # reject symbols the provider can't quote
+    if not _valid_symbol(symbol):
         return None
 
-    # reject symbol if it contains comma
-    if "," in symbol:
-        return None
+    # serve from cache, including symbols already known to be invalid
+    if not fresh:
+        cached = _cached([symbol])
+        if symbol in cached:
+            count("quote_cache_hits")
+            return cached[symbol]
+        count("quote_cache_misses")
 
-    # query Yahoo for quote
-    # http://stackoverflow.com/a/21351911
+    # join a fetch of this symbol already in flight, or start one
     try:
+        with span("upstream", symbol):
+            return inflight.do(symbol.upper(), lambda: _fetch_one(symbol))
+    except OSError:
+        return None
+
+
+@traced("lookup")
+def lookup_many(symbols, fresh=False):
+    """Look up quotes for many symbols, returning a dict of symbol to quote (or None)."""
+
+    # drop duplicates but keep the caller's order
+    symbols = list(dict.fromkeys(symbols))
+    quotes = dict.fromkeys(symbols)
+
+    # only symbols missing from the cache go upstream
+    valid = [symbol for symbol in symbols if _valid_symbol(symbol)]
+    if not fresh:
+        cached = _cached(valid)
+        quotes.update(cached)
+        valid = [symbol for symbol in valid if symbol not in cached]
+        count("quote_cache_hits", len(cached))
+        count("quote_cache_misses", len(valid))
+
+    if not valid:
+        return quotes
+
+    # symbols another request is already fetching are waited on rather than fetched again
+    keys = {symbol.upper(): symbol for symbol in valid}
+    with span("upstream", ",".join(keys)[:80]):
+        for key, quote in inflight.do_many(list(keys), _fetch_many).items():
+            quotes[keys[key]] = quote
+
+    return quotes
+
+
+def refresh_many(symbols, margin):
+    """
+    Refetch quotes for symbols that expire within margin seconds, as the prefetcher does.
+
+    Entries another worker refreshed recently enough are taken from the shared
+    store instead, so each symbol goes upstream about once per TTL however many
+    workers prefetch it.
+    """
+    symbols = [symbol for symbol in dict.fromkeys(symbols) if _valid_symbol(symbol)]
+    if quote_store is not None:
+        promoted = {}
+        for symbol, (quote, left) in quote_store.get_many(symbols).items():
+            if left > margin:
+                quote_cache.set(symbol, quote, ttl=left)
+                promoted[symbol] = quote
+        if promoted:
+            _notify(promoted)
+        symbols = [symbol for symbol in symbols if symbol not in promoted]
+    if symbols:
+        lookup_many(symbols, fresh=True)
+
+
+def _valid_symbol(symbol):
+    """Return True if symbol can be sent to the provider."""
+
+    # reject empty symbols and symbols starting with caret
+    if not symbol or symbol.startswith("^"):
+        return False
 
-        # GET CSV
-        url = f"http://download.finance.yahoo.com/d/quotes.csv?f=snl1&s={symbol}"
-        webpage = urllib.request.urlopen(url)
+    # reject symbol if it contains comma, as commas separate symbols in batch requests
+    return "," not in symbol
+
+
+def _cached(symbols):
+    """Return {symbol: quote} for symbols found in the worker or shared cache."""
+    found = {}
+    missing = []
+    for symbol in symbols:
+        hit, quote = quote_cache.get(symbol)
+        if hit:
+            found[symbol] = quote
+        else:
+            missing.append(symbol)
+
+    # promote shared entries into this worker for whatever is left of their TTL
+    if missing and quote_store is not None:
+        promoted = {}
+        for symbol, (quote, left) in quote_store.get_many(missing).items():
+            quote_cache.set(symbol, quote, ttl=left)
+            promoted[symbol] = quote
+        if promoted:
+            _notify(promoted)
+        found.update(promoted)
+
+    return found
+
+
+def _remember(quotes):
+    """Store fetched quotes in the worker and shared caches."""
+    for symbol, quote in quotes.items():
+        quote_cache.set(symbol, quote)
+    if quote_store is not None:
+        quote_store.set_many(quotes)
+
+    # listeners see symbols uppercased, whatever case the caller looked them up in
+    quotes = {symbol.upper(): quote for symbol, quote in quotes.items()}
+    for listener in fetch_listeners:
+        listener(quotes)
+    _notify(quotes)
+
+
+def _notify(quotes):
+    """Pass new quotes on to quote_listeners, keyed by uppercased symbol."""
+    quotes = {symbol.upper(): quote for symbol, quote in quotes.items()}
+    for listener in quote_listeners:
+        listener(quotes)
+
+
+def _fetch_one(symbol):
+    """Fetch and cache a quote for symbol, raising OSError on network failure."""
+    quote = provider.fetch([symbol]).get(symbol)
+    _remember({symbol: quote})
+    return quote
+
+
+def _fetch_many(symbols):
+    """Fetch quotes for symbols in as few requests as possible."""
+
+    # providers with batch support price a whole chunk in one round trip
+    size = provider.batch_size
+    chunks = [symbols[i:i + size] for i in range(0, len(symbols), size)]
+    quotes = {}
+    failed = []
+    for chunk, result in zip(chunks, _map(_try_fetch_chunk, chunks)):
+        if result is None:
+            failed.extend(chunk)
+        else:
+            quotes.update(result)
+
+    # batch requests failed or provider has no batch support, one request per symbol instead
+    quotes.update(zip(failed, _map(_try_fetch_one, failed)))
+    return quotes
+
+
+def _map(fn, items):
+    """
+    Map fn over items on the shared fetch pool, inline when there is just one.
+
+    Only request threads wait on the pool, never its own threads, so a busy pool
+    slows lookups down but can't deadlock.
+    """
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    return list(fetch_pool.map(fn, items))
+
+
+def _try_fetch_chunk(symbols):
+    """Fetch and cache one batch of symbols, returning None if they must be fetched one by one."""
+    if len(symbols) < 2:
+        return None
+    try:
+        quotes = provider.fetch(symbols)
+    except OSError:
+        return None
+    _remember(quotes)
+    return quotes
 
-        # read CSV
-        datareader = csv.reader(webpage.read().decode("utf-8").splitlines())
 
-        # parse first row
-        row = next(datareader)
-        try:
-            price = float(row[2])
-        except:
-            return None
-    # Parse response
+def _try_fetch_one(symbol):
+    """Fetch a quote for symbol, returning None on network failure."""
     try:
-        #quote = response.json()
-        quote = price
-        return {
-            "name": quote["companyName"],
-            "price": float(quote["latestPrice"]),
-            "symbol": quote["symbol"]
-        }
-    except (KeyError, TypeError, ValueError):
+        return _fetch_one(symbol)
+    except OSError:
         return None
 
 
@@ -0,0 +1,110 @@
+import base64
+import csv
+import io
+import json
+import sqlite3
+
+from datetime import date, timedelta
+from repository import Database
+
+# columns of a history row, in export order
+COLUMNS = ("id", "stock", "quantity", "price", "date")
+
+
+class LedgerReader(Database):
+    """Keyset-paginated and streaming reads of a user's transactions, newest first."""
+
+    def _setup(self, conn):
+        conn.row_factory = sqlite3.Row
+
+    @staticmethod
+    def _query(user_id, symbol=None, start=None, end=None, cursor=None):
+        """Build the filtered, ordered query; rides the (user_id, date) index."""
+        sql = f"SELECT {', '.join(COLUMNS)} FROM transactions WHERE user_id=?"
+        params = [user_id]
+        if symbol:
+            sql += " AND stock=?"
+            params.append(symbol.upper())
+        if start:
+            sql += " AND date>=?"
+            params.append(start.isoformat())
+        if end:
+            # end date is inclusive
+            sql += " AND date<?"
+            params.append((end + timedelta(days=1)).isoformat())
+        if cursor:
+            sql += " AND (date, id)<(?, ?)"
+            params.extend(cursor)
+        return sql + " ORDER BY date DESC, id DESC", params
+
+    def page(self, user_id, symbol=None, start=None, end=None, cursor=None, limit=50):
+        """Return (rows, next cursor or None) for one page of history."""
+        sql, params = self._query(user_id, symbol, start, end, decode_cursor(cursor) if cursor else None)
+
+        # fetch one extra row to know whether there is a next page
+        rows = [dict(row) for row in self._connect().execute(sql + " LIMIT ?", params + [limit + 1])]
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1]["date"], rows[-1]["id"])
+
+    def columns(self, user_id):
+        """Return (stocks, quantities, prices) of every transaction, oldest first."""
+        rows = self._connect().execute("SELECT stock, quantity, price FROM transactions WHERE user_id=? ORDER BY date, id", (user_id,))
+        return tuple(zip(*rows)) or ((), (), ())
+
+    def stream(self, user_id, symbol=None, start=None, end=None, batch=500):
+        """Yield every matching row, holding at most batch rows in memory."""
+        sql, params = self._query(user_id, symbol, start, end)
+
+        # own connection, the response may outlive the request's use of the thread's connection
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            rows = conn.execute(sql, params)
+            while True:
+                chunk = rows.fetchmany(batch)
+                if not chunk:
+                    break
+                yield from chunk
+        finally:
+            conn.close()
+
+    def export_csv(self, user_id, **filters):
+        """Yield history as CSV text, header first."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for i, row in enumerate(self.stream(user_id, **filters), 1):
+            writer.writerow(row)
+
+            # flush in chunks rather than one write per row
+            if i % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def export_ndjson(self, user_id, **filters):
+        """Yield history as one JSON object per line."""
+        for row in self.stream(user_id, **filters):
+            yield json.dumps(dict(zip(COLUMNS, row))) + "\n"
+
+
+def encode_cursor(date, id):
+    """Encode the (date, id) of the last row on a page as an opaque URL-safe string."""
+    return base64.urlsafe_b64encode(f"{date}|{id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor, raising ValueError if it is malformed."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date, id = value.rsplit("|", 1)
+        return date, int(id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+
+
+def parse_date(value):
+    """Parse an optional YYYY-MM-DD filter, raising ValueError if malformed."""
+    return date.fromisoformat(value) if value else None
@@ -0,0 +1,97 @@
+import threading
+
+from background import Background
+
+
+class HubFull(Exception):
+    """This worker already serves as many live streams as it is allowed."""
+
+
+class Subscription:
+    """One connection's symbols, with price changes coalesced until it next reads."""
+
+    def __init__(self, hub, symbols):
+        self.hub = hub
+        self.symbols = frozenset(symbol.upper() for symbol in symbols)
+        self._sent = {}
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def publish(self, quotes):
+        """Queue prices in {SYMBOL: quote} that changed since last sent, newer prices replacing older."""
+        with self._cond:
+            for symbol in self.symbols.intersection(quotes):
+                quote = quotes[symbol]
+                if quote is not None and self._sent.get(symbol) != quote["price"]:
+                    self._pending[symbol] = quote["price"]
+            if self._pending:
+                self._cond.notify()
+
+    def wait(self, timeout):
+        """Return {symbol: price} changed since the last call, or {} after timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending, timeout)
+            changed, self._pending = self._pending, {}
+            self._sent.update(changed)
+            return changed
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class QuoteHub:
+    """
+    One quote polling loop per worker shared by every live connection.
+
+    Every interval seconds it looks up the union of subscribed symbols, which only
+    goes upstream for quotes the cache has let expire, and fans them out. Quotes
+    learned any other way can be fed in through publish(). At most limit
+    subscriptions are open at once, None for no limit.
+    """
+
+    def __init__(self, lookup_many, interval=5, limit=None):
+        self.lookup_many = lookup_many
+        self.interval = interval
+        self.limit = limit
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._background = Background(self._run, "quote-hub")
+        self._stopping = self._background.stopping
+
+    def subscribe(self, symbols):
+        """Return a Subscription to symbols, primed with their current quotes, raising HubFull past the limit."""
+        subscription = Subscription(self, symbols)
+        with self._lock:
+            if self.limit is not None and len(self._subscriptions) >= self.limit:
+                raise HubFull()
+            self._subscriptions.add(subscription)
+        self._background.start()
+        subscription.publish({symbol.upper(): quote for symbol, quote in self.lookup_many(list(subscription.symbols)).items()})
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, quotes):
+        """Fan {symbol: quote} out to every subscription holding one of its symbols, whatever their case."""
+        quotes = {symbol.upper(): quote for symbol, quote in quotes.items()}
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.publish(quotes)
+
+    def stop(self, timeout=5):
+        self._background.stop(timeout)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            with self._lock:
+                symbols = set().union(*(subscription.symbols for subscription in self._subscriptions))
+            if not symbols:
+                continue
+            try:
+                self.publish(self.lookup_many(sorted(symbols)))
+            except Exception:
+                # try again next round
+                pass
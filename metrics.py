@@ -0,0 +1,192 @@
+import threading
+import time
+
+from contextlib import contextmanager
+from functools import wraps
+from flask import Response, request, template_rendered, before_render_template
+
+# histogram buckets for durations in seconds and for spans per request
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# the request being traced on this thread, if any
+_local = threading.local()
+
+
+class Trace:
+    """Spans and counters of one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self.slowest = []
+        self.finished = False
+
+    def add(self, kind, detail, seconds):
+        count, total = self.spans.get(kind, (0, 0.0))
+        self.spans[kind] = (count + 1, total + seconds)
+
+        # keep the few slowest spans for the slow request log
+        self.slowest.append((seconds, kind, detail))
+        if len(self.slowest) > 20:
+            self.slowest.sort(key=lambda span: span[0], reverse=True)
+            del self.slowest[5:]
+
+
+@contextmanager
+def span(kind, detail=None):
+    """Time the block as a span of kind in the current request's trace, if there is one."""
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(kind, detail, time.perf_counter() - start)
+
+
+def count(name, n=1):
+    """Add n to counter name in the current request's trace, if there is one."""
+    trace = getattr(_local, "trace", None)
+    if trace is not None and n:
+        trace.counters[name] = trace.counters.get(name, 0) + n
+
+
+def traced(kind):
+    """Decorate functions so every call is a span of kind, detailed by the first argument if that is a string."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(kind, args[0][:80] if args and isinstance(args[0], str) else None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count, as Prometheus keeps them."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Per-route histograms of request duration, and of time and count per request of each span kind.
+
+    Aggregated in the worker that served the request, so each gunicorn worker
+    exposes its own numbers.
+    """
+
+    def __init__(self, slow=None, logger=None):
+        self.slow = slow
+        self.logger = logger
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def record(self, trace, route, method, status):
+        """Fold a finished request's trace into the histograms."""
+        elapsed = time.perf_counter() - trace.start
+        with self._lock:
+            self._observe("finance_request_duration_seconds", (("route", route), ("method", method), ("status", str(status))), elapsed, DURATION_BUCKETS)
+            for kind, (n, seconds) in trace.spans.items():
+                self._observe("finance_span_duration_seconds", (("route", route), ("kind", kind)), seconds, DURATION_BUCKETS)
+                self._observe("finance_spans_per_request", (("route", route), ("kind", kind)), n, COUNT_BUCKETS)
+            for name, n in trace.counters.items():
+                key = (route, name)
+                self._counters[key] = self._counters.get(key, 0) + n
+
+        if self.slow is not None and self.logger is not None and elapsed * 1000 >= self.slow:
+            breakdown = ", ".join(f"{kind} {n}x {seconds * 1000:.1f} ms" for kind, (n, seconds) in sorted(trace.spans.items()))
+            slowest = "; ".join(f"{kind} {seconds * 1000:.1f} ms {detail or ''}".rstrip()
+                                for seconds, kind, detail in sorted(trace.slowest, key=lambda span: span[0], reverse=True)[:5])
+            self.logger.warning(f"slow request {method} {route} {status} {elapsed * 1000:.1f} ms: {breakdown or 'no spans'}; slowest: {slowest or '-'}")
+
+    def render(self):
+        """Return every metric in Prometheus text format."""
+        lines = []
+        with self._lock:
+            named = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        typed = set()
+        for (name, labels), histogram in named:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            label = ",".join(f'{key}="{value}"' for key, value in labels)
+            for bound, n in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {n}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f"{name}_sum{{{label}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{label}}} {histogram.count}")
+
+        if counters:
+            lines.append("# TYPE finance_events_total counter")
+        for (route, name), n in counters:
+            lines.append(f'finance_events_total{{route="{route}",event="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+def instrument(app, metrics):
+    """Trace every request to app into metrics, timing templates too, and serve them on /metrics."""
+
+    @app.before_request
+    def start_trace():
+        _local.trace = Trace()
+
+    @app.after_request
+    def finish_trace(response):
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.finished = True
+            metrics.record(trace, request.url_rule.rule if request.url_rule else "unmatched", request.method, response.status_code)
+        return response
+
+    @app.teardown_request
+    def clear_trace(exception):
+        # a request that raised never reached after_request
+        trace = getattr(_local, "trace", None)
+        if trace is not None and not trace.finished:
+            metrics.record(trace, request.url_rule.rule if request.url_rule else "unmatched", request.method, 500)
+        _local.trace = None
+
+    # a stack, as templates can render partials while they render
+    def before_render(sender, template, context, **extra):
+        if getattr(_local, "rendering", None) is None:
+            _local.rendering = []
+        _local.rendering.append(time.perf_counter())
+
+    def rendered(sender, template, context, **extra):
+        trace = getattr(_local, "trace", None)
+        rendering = getattr(_local, "rendering", None)
+        if rendering:
+            start = rendering.pop()
+            if trace is not None:
+                trace.add("template", template.name, time.perf_counter() - start)
+
+    before_render_template.connect(before_render, app, weak=False)
+    template_rendered.connect(rendered, app, weak=False)
+
+    app.add_url_rule("/metrics", "metrics", lambda: Response(metrics.render(), mimetype="text/plain; version=0.0.4"))
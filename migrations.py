@@ -0,0 +1,96 @@
+import sqlite3
+import sys
+
+# schema changes in order, the database's PRAGMA user_version counts how many have been applied
+MIGRATIONS = [
+    # 1: ledger of every trade
+    [
+        """CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            user_id INTEGER NOT NULL,
+            stock TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price NUMERIC NOT NULL,
+            date DATETIME NOT NULL
+        )""",
+    ],
+
+    # 2: current holdings per user, backfilled from the ledger, replacing the global portfolio table
+    [
+        """CREATE TABLE IF NOT EXISTS positions (
+            user_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (user_id, symbol)
+        )""",
+        "INSERT OR IGNORE INTO positions (user_id, symbol, quantity) SELECT user_id, stock, SUM(quantity) FROM transactions GROUP BY user_id, stock HAVING SUM(quantity) > 0",
+        "DROP TABLE IF EXISTS portfolio",
+    ],
+
+    # 3: indexes for login/register by username and history by user
+    [
+        # register() never refused taken usernames, so later duplicates keep their account under "name-id"
+        "UPDATE users SET username=username || '-' || id WHERE id NOT IN (SELECT MIN(id) FROM users GROUP BY username)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS users_username ON users (username)",
+        "CREATE INDEX IF NOT EXISTS transactions_user_date ON transactions (user_id, date)",
+        "CREATE INDEX IF NOT EXISTS transactions_user_stock ON transactions (user_id, stock)",
+        "ANALYZE",
+    ],
+
+    # 4: bumped by every trade, so cached valuations can tell when holdings changed
+    [
+        "ALTER TABLE users ADD COLUMN positions_version INTEGER NOT NULL DEFAULT 0",
+    ],
+
+    # 5: resting limit and stop orders, open ones indexed apart so loading the book skips closed history
+    [
+        """CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            user_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            side TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            shares INTEGER NOT NULL,
+            trigger_price NUMERIC NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open',
+            created DATETIME NOT NULL,
+            closed DATETIME,
+            price NUMERIC,
+            transaction_id INTEGER,
+            error TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS orders_open ON orders (id) WHERE status='open'",
+        "CREATE INDEX IF NOT EXISTS orders_user ON orders (user_id, id)",
+    ],
+]
+
+
+def migrate(path, timeout=30.0):
+    """Apply pending migrations to the database at path, returning its new version."""
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    try:
+        # WAL lets readers carry on while a trade commits, and is remembered by the file
+        conn.execute("PRAGMA journal_mode=WAL")
+
+        while True:
+            # take the write lock before reading the version, so concurrent workers migrate once
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.execute("COMMIT")
+                return version
+            try:
+                for statement in MIGRATIONS[version]:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version={version + 1}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "finance.db"
+    print(f"{path} is at version {migrate(path)}")
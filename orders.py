@@ -0,0 +1,251 @@
+import math
+import sqlite3
+import threading
+import time
+
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from datetime import datetime
+
+from background import Background
+from repository import Database
+from trades import TradeError
+
+SIDES = ("buy", "sell")
+KINDS = ("limit", "stop")
+
+# columns of an order as listed to its owner
+COLUMNS = ("id", "symbol", "side", "kind", "shares", "trigger_price", "status", "created", "closed", "price", "transaction_id", "error")
+
+
+class OrderError(Exception):
+    """An order that can't be placed or cancelled, with a message fit to show the user."""
+
+
+class Order(namedtuple("Order", "id user_id symbol side kind shares trigger")):
+    """One open order as the matcher holds it."""
+
+    @property
+    def rising(self):
+        """True if the order fires once the price rises to its trigger, as sell limits and buy stops do."""
+        return (self.side == "sell") == (self.kind == "limit")
+
+    @property
+    def quantity(self):
+        """Shares as a trade leg, negative for sells."""
+        return self.shares if self.side == "buy" else -self.shares
+
+    def crossed(self, price):
+        return price >= self.trigger if self.rising else price <= self.trigger
+
+
+class OrderBook(Database):
+    """
+    Resting limit and stop orders, matched against quotes on a background thread.
+
+    Open orders are kept per symbol on two price ladders sorted by trigger: orders
+    firing once the price rises to their trigger and orders firing once it falls to
+    it. A quote only visits the orders it crossed, found by bisection. Crossed
+    orders are repriced with a fresh quote and filled through TradeExecutor.fill.
+
+    Every worker runs its own matcher, picking up orders placed elsewhere from the
+    orders table each round; fill claims the order in the trade's transaction, so
+    only one of them fills it. Crossed orders another worker already closed are
+    dropped before they are repriced.
+    """
+
+    def __init__(self, path, trader, lookup_many, interval=5, timeout=5.0, clock=time.monotonic):
+        super().__init__(path, timeout)
+        self.trader = trader
+        self.lookup_many = lookup_many
+        self.interval = interval
+        self.clock = clock
+        self._reset()
+        self._cond = threading.Condition()
+
+        # whatever a forked worker copied from its parent is reloaded from the table
+        self._background = Background(self._run, "order-matcher", wake=self._wake, reset=self._reset)
+        self._stopping = self._background.stopping
+
+    def _setup(self, conn):
+        conn.row_factory = sqlite3.Row
+
+    def _reset(self):
+        # symbol -> {rising: sorted [(trigger, id)]}, and id -> Order for everything on a ladder
+        self._ladders = {}
+        self._orders = {}
+        self._loaded = 0
+        self._prices = {}
+        self._due = set()
+        self._checked = float("-inf")
+
+    def place(self, user_id, symbol, side, kind, shares, trigger):
+        """Rest an order, returning its id, raising OrderError if it is malformed."""
+        if side not in SIDES or kind not in KINDS:
+            raise OrderError("side must be buy or sell and type limit or stop")
+        if shares <= 0 or not math.isfinite(trigger) or trigger <= 0:
+            raise OrderError("shares and price must be positive numbers")
+        symbol = symbol.upper()
+
+        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        id = self._connect().execute("INSERT INTO orders (user_id, symbol, side, kind, shares, trigger_price, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (user_id, symbol, side, kind, shares, trigger, date)).lastrowid
+
+        # check it against the current price without waiting for the next round
+        self._background.start()
+        with self._cond:
+            self._add(Order(id, user_id, symbol, side, kind, shares, float(trigger)))
+            self._due.add(symbol)
+            self._cond.notify()
+        return id
+
+    def cancel(self, user_id, order_id):
+        """Cancel user's open order, raising OrderError if there is none such."""
+        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if not self._connect().execute("UPDATE orders SET status='cancelled', closed=? WHERE id=? AND user_id=? AND status='open'",
+                                       (date, order_id, user_id)).rowcount:
+            raise OrderError("no such open order")
+
+        # other workers drop it when it is next crossed and found closed
+        with self._cond:
+            order = self._orders.get(order_id)
+            if order is not None:
+                self._remove(order)
+
+    def orders(self, user_id, status=None, limit=100):
+        """Return user's orders as dicts, newest first, optionally only those with status."""
+        sql = f"SELECT {', '.join(COLUMNS)} FROM orders WHERE user_id=?"
+        params = [user_id]
+        if status:
+            sql += " AND status=?"
+            params.append(status)
+        rows = self._connect().execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit])
+        return [dict(row) for row in rows]
+
+    def publish(self, quotes):
+        """Quote listener: queue prices of symbols with open orders for the matcher."""
+        self._background.start()
+        with self._cond:
+            prices = {symbol.upper(): quote["price"] for symbol, quote in quotes.items()
+                      if quote is not None and symbol.upper() in self._ladders}
+            if prices:
+                self._prices.update(prices)
+                self._cond.notify()
+
+    def stop(self, timeout=5):
+        self._background.stop(timeout)
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def _add(self, order):
+        """Put order on its ladder, unless place() and _sync() both got there and it already is."""
+        if order.id in self._orders:
+            return
+        self._orders[order.id] = order
+        insort(self._ladders.setdefault(order.symbol, {True: [], False: []})[order.rising], (order.trigger, order.id))
+
+    def _remove(self, order):
+        ladders = self._ladders[order.symbol]
+        ladder = ladders[order.rising]
+        i = bisect_left(ladder, (order.trigger, order.id))
+        if i < len(ladder) and ladder[i] == (order.trigger, order.id):
+            del ladder[i]
+        del self._orders[order.id]
+        if not ladders[True] and not ladders[False]:
+            del self._ladders[order.symbol]
+
+    def _sync(self):
+        """Load orders placed since the last round, by this worker or any other."""
+        rows = self._connect().execute("SELECT id, user_id, symbol, side, kind, shares, trigger_price FROM orders WHERE status='open' AND id>? ORDER BY id",
+                                       (self._loaded,)).fetchall()
+        with self._cond:
+            for row in rows:
+                self._add(Order(*row[:6], float(row["trigger_price"])))
+                self._loaded = max(self._loaded, row["id"])
+
+    def _still_open(self, orders):
+        """Return those of orders still open in the table, the rest stay off the ladders."""
+        ids = set()
+        conn = self._connect()
+        for i in range(0, len(orders), 500):
+            chunk = [order.id for order in orders[i:i + 500]]
+            rows = conn.execute(f"SELECT id FROM orders WHERE status='open' AND id IN ({', '.join('?' * len(chunk))})", chunk)
+            ids.update(row["id"] for row in rows)
+        return [order for order in orders if order.id in ids]
+
+    def _crossed(self, prices):
+        """Take every order crossed by prices off its ladder, returning them."""
+        crossed = []
+        with self._cond:
+            for symbol, price in prices.items():
+                ladders = self._ladders.get(symbol)
+                if ladders is None:
+                    continue
+
+                # rising orders fire at triggers up to the price, falling ones at triggers from it
+                i = bisect_right(ladders[True], (price, float("inf")))
+                j = bisect_left(ladders[False], (price, float("-inf")))
+                hits = [self._orders[id] for _, id in ladders[True][:i] + ladders[False][j:]]
+                for order in hits:
+                    self._remove(order)
+                crossed.extend(hits)
+        return crossed
+
+    def _fill(self, order, price):
+        try:
+            self.trader.fill(order.id, order.user_id, order.symbol, order.quantity, price)
+        except TradeError as e:
+            # the user can't cover it any more, close it rather than retry forever
+            date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self._connect().execute("UPDATE orders SET status='rejected', closed=?, error=? WHERE id=? AND status='open'", (date, str(e), order.id))
+
+    def _match(self, prices):
+        """Fill orders crossed by prices."""
+        crossed = self._crossed(prices)
+        if crossed:
+            # filled, cancelled or rejected by another worker, so not worth a fresh quote
+            crossed = self._still_open(crossed)
+        if not crossed:
+            return
+
+        # trades never use cached prices, orders the fresh quote no longer crosses go back on the book
+        quotes = self.lookup_many(sorted({order.symbol for order in crossed}), fresh=True)
+        fresh = {symbol.upper(): quote["price"] for symbol, quote in quotes.items() if quote is not None}
+        for order in crossed:
+            if order.symbol in fresh and order.crossed(fresh[order.symbol]):
+                try:
+                    self._fill(order, fresh[order.symbol])
+                    continue
+                except Exception:
+                    # retried when next crossed
+                    pass
+            with self._cond:
+                self._add(order)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            with self._cond:
+                self._cond.wait_for(lambda: self._prices or self._due or self._stopping.is_set(),
+                                    max(self._checked + self.interval - self.clock(), 0))
+                prices, self._prices = self._prices, {}
+                due, self._due = self._due, set()
+            if self._stopping.is_set():
+                return
+            try:
+                self._sync()
+
+                # every interval look up every symbol with open orders, which only goes upstream for expired quotes
+                if self.clock() >= self._checked + self.interval:
+                    self._checked = self.clock()
+                    with self._cond:
+                        due.update(self._ladders)
+                due.difference_update(prices)
+                if due:
+                    quotes = self.lookup_many(sorted(due))
+                    prices.update({symbol.upper(): quote["price"] for symbol, quote in quotes.items() if quote is not None})
+                self._match(prices)
+            except Exception:
+                # try again next round
+                pass
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from background import Background
+
+
+class QuotePrefetcher:
+    """
+    Background thread keeping quotes of symbols held by active sessions warm.
+
+    Every interval seconds it refetches the union of symbols tracked for users
+    seen within idle seconds, least recently refreshed first, at most rate symbols
+    per second. prewarm() jumps the queue and wakes the thread at once.
+    """
+
+    def __init__(self, fetch, interval=30, rate=50, idle=900, clock=time.monotonic):
+        self.fetch = fetch
+        self.interval = interval
+        self.rate = rate
+        self.idle = idle
+        self.clock = clock
+        self._sessions = {}
+        self._refreshed = {}
+        self._urgent = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._background = Background(self._run, "quote-prefetcher", wake=self._wake.set)
+        self._stopping = self._background.stopping
+
+    def track(self, user_id, symbols):
+        """Remember the symbols user holds and that user is active."""
+        with self._lock:
+            self._sessions[user_id] = (frozenset(symbols), self.clock())
+        self._background.start()
+
+    def prewarm(self, user_id, symbols):
+        """Track user's symbols and fetch them without waiting for the schedule."""
+        self.track(user_id, symbols)
+        with self._lock:
+            self._urgent.update(symbols)
+        self._wake.set()
+
+    def forget(self, user_id):
+        """Stop refreshing for user, as on logout."""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def stop(self, timeout=5):
+        """Stop the thread, waiting for a fetch in progress to finish."""
+        self._background.stop(timeout)
+
+    def _due(self):
+        """Return symbols to refresh this round, urgent ones first, within the rate limit."""
+        now = self.clock()
+        with self._lock:
+            # sessions not seen for idle seconds no longer count
+            for user_id, (_, seen) in list(self._sessions.items()):
+                if seen <= now - self.idle:
+                    del self._sessions[user_id]
+            held = set().union(*(symbols for symbols, _ in self._sessions.values()))
+            for symbol in list(self._refreshed):
+                if symbol not in held:
+                    del self._refreshed[symbol]
+
+            # anything urgent beyond one round's budget waits for the next round
+            budget = max(int(self.rate * self.interval), 1)
+            urgent = sorted(self._urgent)[:budget]
+            self._urgent.difference_update(urgent)
+
+            # half an interval of slack, so a symbol refreshed just after the last round isn't skipped until the one after
+            rest = sorted((symbol for symbol in held if symbol not in self._urgent and symbol not in urgent
+                           and self._refreshed.get(symbol, float("-inf")) <= now - self.interval / 2),
+                          key=lambda symbol: self._refreshed.get(symbol, float("-inf")))
+        return (urgent + rest)[:budget]
+
+    def _run(self):
+        while not self._stopping.is_set():
+            symbols = self._due()
+            if symbols:
+                try:
+                    self.fetch(symbols)
+                except Exception:
+                    # a failed round is retried on the next one
+                    pass
+                else:
+                    now = self.clock()
+                    with self._lock:
+                        for symbol in symbols:
+                            self._refreshed[symbol] = now
+
+                # pace rounds so upstream never sees more than rate symbols a second
+                self._stopping.wait(len(symbols) / self.rate)
+
+            # sleep until the next round or an urgent prewarm
+            self._wake.wait(self.interval if not self._urgent else 0)
+            self._wake.clear()
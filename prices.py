@@ -0,0 +1,114 @@
+import fcntl
+import os
+import re
+import time
+
+import numpy as np
+
+# one fixed-width record per quote: unix time in milliseconds, price
+RECORD = np.dtype([("t", "<i8"), ("price", "<f8")])
+
+# resample intervals in seconds
+INTERVALS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+
+# symbols that are safe to use as file names
+SYMBOL = re.compile(r"^[A-Z0-9][A-Z0-9.\-]{0,15}$")
+
+
+class PriceStore:
+    """
+    Append-only price history, one file of fixed-width records per symbol.
+
+    Appends take an exclusive lock on the file and never write a time earlier than
+    the last record's, so every gunicorn worker can record into the same directory
+    and each file stays sorted. Reads memory-map the file and binary search the
+    time column rather than scanning it.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, symbol):
+        return os.path.join(self.path, f"{symbol}.bin")
+
+    def record(self, quotes, at=None):
+        """Append {symbol: quote} at time at (default now), skipping unknown symbols."""
+        t = int((self.clock() if at is None else at) * 1000)
+        for symbol, quote in quotes.items():
+            if quote is None or not SYMBOL.match(symbol):
+                continue
+            try:
+                fd = os.open(self._file(symbol), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    # released by close, serializes appends by every worker and thread
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+
+                    # drop a partial record left by an interrupted write, then stay at or after the last record
+                    size = os.fstat(fd).st_size
+                    end = size - size % RECORD.itemsize
+                    if end != size:
+                        os.ftruncate(fd, end)
+                    at_least = t
+                    if end:
+                        last = np.frombuffer(os.pread(fd, RECORD.itemsize, end - RECORD.itemsize), dtype=RECORD)
+                        at_least = max(t, int(last["t"][0]))
+                    os.write(fd, np.array([(at_least, quote["price"])], dtype=RECORD).tobytes())
+                finally:
+                    os.close(fd)
+            except OSError:
+                # history is best effort, never fail a lookup over it
+                pass
+
+    def _load(self, symbol):
+        """Return symbol's records ordered by time, empty if there are none."""
+        symbol = symbol.upper()
+        if not SYMBOL.match(symbol):
+            return np.empty(0, dtype=RECORD)
+        try:
+            size = os.path.getsize(self._file(symbol))
+        except OSError:
+            return np.empty(0, dtype=RECORD)
+
+        # ignore a trailing partial record from an interrupted write
+        count = size // RECORD.itemsize
+        if not count:
+            return np.empty(0, dtype=RECORD)
+        return np.memmap(self._file(symbol), dtype=RECORD, mode="r", shape=(count,))
+
+    def range(self, symbol, start=None, end=None):
+        """Return (times in seconds, prices) for symbol with start <= time < end."""
+        records = self._load(symbol)
+        t = records["t"]
+        lo = 0 if start is None else np.searchsorted(t, int(start * 1000), side="left")
+        hi = len(t) if end is None else np.searchsorted(t, int(end * 1000), side="left")
+        records = records[lo:hi]
+        return records["t"] / 1000, np.array(records["price"])
+
+    def resample(self, symbol, interval, start=None, end=None):
+        """Return OHLC bars for symbol, one per interval in INTERVALS that has any quotes."""
+        width = INTERVALS[interval]
+        times, prices = self.range(symbol, start, end)
+        if not len(times):
+            return []
+
+        # quotes are ordered, so each bucket is one contiguous run
+        buckets = (times // width).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)]
+        return [{
+            "time": int(bucket * width),
+            "open": float(open),
+            "high": float(high),
+            "low": float(low),
+            "close": float(close),
+            "count": int(count)
+        } for bucket, open, high, low, close, count in zip(
+            buckets[starts],
+            prices[starts],
+            np.maximum.reduceat(prices, starts),
+            np.minimum.reduceat(prices, starts),
+            prices[ends - 1],
+            ends - starts
+        )]
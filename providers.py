@@ -0,0 +1,228 @@
+import bisect
+import csv
+import math
+import os
+import random
+import threading
+import time
+import zlib
+
+from client import QuoteClient
+from datetime import datetime
+
+
+class QuoteProvider:
+    """Source of quotes. fetch() returns {symbol: quote or None} and raises OSError on failure."""
+
+    # most symbols a single fetch() call should be given
+    batch_size = 1
+
+    def fetch(self, symbols):
+        raise NotImplementedError
+
+
+class YahooProvider(QuoteProvider):
+    """Yahoo quotes.csv endpoint, which takes a comma separated symbol list."""
+
+    batch_size = 200
+
+    def __init__(self, client):
+        self.client = client
+
+    def fetch(self, symbols):
+        # http://stackoverflow.com/a/21351911
+        response = self.client.get("/d/quotes.csv", params={"f": "snl1", "s": ",".join(symbols)})
+        response.raise_for_status()
+        rows = list(csv.reader(response.text.splitlines()))
+
+        # rows come back in request order, one per symbol
+        if len(rows) != len(symbols):
+            raise OSError(f"expected {len(symbols)} rows from quotes.csv, got {len(rows)}")
+        return {symbol: self._parse(row) for symbol, row in zip(symbols, rows)}
+
+    @staticmethod
+    def _parse(row):
+        try:
+            return {
+                "name": row[1],
+                "price": float(row[2]),
+                "symbol": row[0].upper()
+            }
+        except (IndexError, TypeError, ValueError):
+            return None
+
+
+class IEXProvider(QuoteProvider):
+    """IEX Cloud market batch endpoint."""
+
+    batch_size = 100
+
+    def __init__(self, client, token):
+        self.client = client
+        self.token = token
+
+    def fetch(self, symbols):
+        response = self.client.get("/stable/stock/market/batch",
+                                   params={"symbols": ",".join(symbols), "types": "quote", "token": self.token})
+        response.raise_for_status()
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise OSError(f"invalid JSON from IEX: {e}")
+
+        # unknown symbols are simply missing from the response
+        quotes = {}
+        for symbol in symbols:
+            try:
+                quote = data[symbol.upper()]["quote"]
+                quotes[symbol] = {
+                    "name": quote["companyName"],
+                    "price": float(quote["latestPrice"]),
+                    "symbol": quote["symbol"]
+                }
+            except (KeyError, TypeError, ValueError):
+                quotes[symbol] = None
+        return quotes
+
+
+class ReplayProvider(QuoteProvider):
+    """Replay recorded ticks from a CSV or Parquet file with timestamp, symbol, price and optional name columns."""
+
+    batch_size = 1000
+
+    def __init__(self, path, speed=1.0, loop=True, clock=time.monotonic):
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+        self._ticks = {}
+        for timestamp, symbol, price, name in self._read(path):
+            self._ticks.setdefault(symbol.upper(), []).append((timestamp, price, name or symbol.upper()))
+        if not self._ticks:
+            raise ValueError(f"no ticks in {path}")
+        for ticks in self._ticks.values():
+            ticks.sort(key=lambda tick: tick[0])
+        self._times = {symbol: [tick[0] for tick in ticks] for symbol, ticks in self._ticks.items()}
+        self.start = min(times[0] for times in self._times.values())
+        self.end = max(times[-1] for times in self._times.values())
+        self.started = clock()
+
+    @staticmethod
+    def _read(path):
+        """Yield (timestamp, symbol, price, name) rows."""
+        if path.endswith(".parquet"):
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                raise RuntimeError("replaying Parquet files requires pyarrow")
+            rows = pyarrow.parquet.read_table(path).to_pylist()
+        else:
+            with open(path, newline="") as f:
+                rows = list(csv.DictReader(f))
+        for row in rows:
+            yield _timestamp(row["timestamp"]), row["symbol"], float(row["price"]), row.get("name")
+
+    def now(self):
+        """Return the position of the playback clock within the recording."""
+        elapsed = (self.clock() - self.started) * self.speed
+        span = self.end - self.start
+        if self.loop and span > 0:
+            elapsed %= span
+        return self.start + elapsed
+
+    def fetch(self, symbols):
+        now = self.now()
+        quotes = {}
+        for symbol in symbols:
+            key = symbol.upper()
+            times = self._times.get(key)
+            if times is None:
+                quotes[symbol] = None
+                continue
+
+            # latest tick at or before the playback clock, or the first tick if the symbol hasn't traded yet
+            i = max(bisect.bisect_right(times, now) - 1, 0)
+            _, price, name = self._ticks[key][i]
+            quotes[symbol] = {"name": name, "price": price, "symbol": key}
+        return quotes
+
+
+class SyntheticProvider(QuoteProvider):
+    """Deterministic geometric random walk per symbol, advancing one step every interval seconds."""
+
+    batch_size = 1000
+
+    def __init__(self, seed=0, interval=1.0, volatility=0.01, clock=time.monotonic):
+        self.seed = seed
+        self.interval = interval
+        self.volatility = volatility
+        self.clock = clock
+        self.started = clock()
+        self._walks = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, symbols):
+        step = int((self.clock() - self.started) / self.interval) if self.interval else 0
+        return {symbol: self._quote(symbol.upper(), step) for symbol in symbols}
+
+    def _quote(self, symbol, step):
+        # anything that doesn't look like a ticker is an invalid symbol
+        if not symbol.isalpha() or len(symbol) > 5:
+            return None
+
+        with self._lock:
+            walk = self._walks.get(symbol)
+            if walk is None:
+                # seeded from a stable hash so every process sees the same prices
+                seed = zlib.crc32(f"{self.seed}:{symbol}".encode())
+                walk = self._walks[symbol] = [random.Random(seed), 0, 10.0 + seed % 49000 / 100]
+            rng, at, price = walk
+            while at < step:
+                price *= math.exp(rng.gauss(0, self.volatility))
+                at += 1
+            walk[1:] = [at, price]
+
+        return {"name": f"{symbol} Inc.", "price": round(price, 2), "symbol": symbol}
+
+
+def _timestamp(value):
+    """Parse epoch seconds or an ISO 8601 timestamp."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def create_provider(name=None, environ=os.environ):
+    """Build the provider named by QUOTE_PROVIDER (yahoo, iex, replay or synthetic)."""
+    name = (name or environ.get("QUOTE_PROVIDER", "yahoo")).lower()
+
+    if name == "synthetic":
+        return SyntheticProvider(seed=int(environ.get("QUOTE_SEED", 0)),
+                                 interval=float(environ.get("QUOTE_INTERVAL", 1)),
+                                 volatility=float(environ.get("QUOTE_VOLATILITY", 0.01)))
+
+    if name == "replay":
+        if not environ.get("QUOTE_REPLAY_FILE"):
+            raise RuntimeError("QUOTE_REPLAY_FILE not set")
+        return ReplayProvider(environ["QUOTE_REPLAY_FILE"],
+                              speed=float(environ.get("QUOTE_REPLAY_SPEED", 1)),
+                              loop=environ.get("QUOTE_REPLAY_LOOP", "1") != "0")
+
+    if name not in ("yahoo", "iex"):
+        raise RuntimeError(f"unknown QUOTE_PROVIDER {name}")
+
+    # pooled keep-alive connection to the quote provider, never waits on it forever
+    default_url = "https://cloud.iexapis.com" if name == "iex" else "http://download.finance.yahoo.com"
+    client = QuoteClient(environ.get("QUOTE_URL", default_url),
+                         connect_timeout=float(environ.get("QUOTE_CONNECT_TIMEOUT", 2)),
+                         read_timeout=float(environ.get("QUOTE_READ_TIMEOUT", 5)),
+                         retries=int(environ.get("QUOTE_RETRIES", 2)),
+                         pool_size=int(environ.get("QUOTE_POOL_SIZE", 10)))
+
+    if name == "iex":
+        if not environ.get("API_KEY"):
+            raise RuntimeError("API_KEY not set")
+        return IEXProvider(client, environ["API_KEY"])
+    return YahooProvider(client)
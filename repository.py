@@ -0,0 +1,158 @@
+import os
+import queue
+import sqlite3
+import threading
+import weakref
+
+from metrics import span
+
+# every store, so connections borrowed for a request can be handed back at its end
+_databases = weakref.WeakSet()
+
+
+def _greenlets():
+    """Return True if gevent has patched threading, making thread-locals per greenlet."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def release_connections():
+    """Hand every connection the current thread or greenlet borrowed back to its pool."""
+    for database in list(_databases):
+        database.release()
+
+
+class Database:
+    """
+    One sqlite3 connection per thread, reopened after a fork.
+
+    sqlite3 keeps each connection's compiled statements in a cache keyed by SQL
+    text, so queries written once with ? placeholders are only prepared once per
+    thread. Under gevent, where every client connection is a greenlet of its own,
+    connections are instead borrowed from a pool of up to pool_size idle ones and
+    handed back by release() at the end of each request.
+    """
+
+    def __init__(self, path, timeout=5.0, statements=256, pool_size=None):
+        self.path = path
+        self.timeout = timeout
+        self.statements = statements
+        self.pool_size = int(os.environ.get("DB_POOL_SIZE", 16)) if pool_size is None else pool_size
+        self._local = threading.local()
+        self._pooled = _greenlets()
+        self._pool = None
+        self._pool_pid = None
+        if self._pooled:
+            _databases.add(self)
+
+    def _connect(self):
+        """Return this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = None
+        if self._pooled:
+            try:
+                conn = self._idle().get_nowait()
+            except queue.Empty:
+                pass
+        if conn is None:
+            conn = self._open()
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _open(self):
+        # autocommit mode, transactions are started explicitly where needed
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, cached_statements=self.statements)
+
+        # with WAL a commit only needs to reach the log, not be synced to the database file
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._setup(conn)
+        return conn
+
+    def _idle(self):
+        """Return this process's queue of idle connections, those of a parent are never reused."""
+        if self._pool_pid != os.getpid():
+            self._pool = queue.LifoQueue(maxsize=self.pool_size)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def release(self):
+        """Return a borrowed connection to the pool, closing it if the pool is full; a no-op with real threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pool_pid != os.getpid() or self._local.pid != os.getpid():
+            return
+        self._local.conn = None
+        try:
+            self._idle().put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _setup(self, conn):
+        """Configure a new connection, for subclasses."""
+
+
+class Repository(Database):
+    """Queries on users, positions and cash, as the routes need them."""
+
+    def _query(self, sql, params=()):
+        with span("db", sql[:80]):
+            return self._connect().execute(sql, params)
+
+    def _scalar(self, sql, params=()):
+        """Return the first column of the first row, or None if there is none."""
+        row = self._query(sql, params).fetchone()
+        return row[0] if row else None
+
+    def account(self, user_id):
+        """Return (cash, positions version) of user."""
+        return self._query("SELECT cash, positions_version FROM users WHERE id=?", (user_id,)).fetchone()
+
+    def cash(self, user_id):
+        return self._scalar("SELECT cash FROM users WHERE id=?", (user_id,))
+
+    def positions_version(self, user_id):
+        """Return user's positions version, which every trade increments."""
+        return self._scalar("SELECT positions_version FROM users WHERE id=?", (user_id,))
+
+    def credentials(self, username):
+        """Return (id, hash) of the user called username, or None."""
+        return self._query("SELECT id, hash FROM users WHERE username=?", (username,)).fetchone()
+
+    def create_user(self, username, hash):
+        """Add a user, returning their id, raising ValueError if username is taken."""
+        try:
+            return self._query("INSERT INTO users (username, hash) VALUES (?, ?)", (username, hash)).lastrowid
+        except sqlite3.IntegrityError as e:
+            raise ValueError(str(e))
+
+    def set_hash(self, user_id, hash):
+        self._query("UPDATE users SET hash=? WHERE id=?", (hash, user_id))
+
+    def holdings(self, user_id):
+        """Return (cash, positions version, positions) of user, read in one transaction so they agree."""
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            cash, version = self.account(user_id)
+            positions = self.positions(user_id)
+        finally:
+            conn.execute("COMMIT")
+        return cash, version, positions
+
+    def positions(self, user_id):
+        """Return (symbol, quantity) rows of user's holdings, ordered by symbol."""
+        return self._query("SELECT symbol, quantity FROM positions WHERE user_id=? ORDER BY symbol", (user_id,)).fetchall()
+
+    def symbols(self, user_id):
+        """Return symbols user holds, ordered."""
+        return [row[0] for row in self._query("SELECT symbol FROM positions WHERE user_id=? ORDER BY symbol", (user_id,))]
+
+    def quantity(self, user_id, symbol):
+        """Return shares of symbol user holds, 0 if none."""
+        return self._scalar("SELECT quantity FROM positions WHERE user_id=? AND symbol=?", (user_id, symbol)) or 0
@@ -0,0 +1,95 @@
+import secrets
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from repository import Database
+from werkzeug.datastructures import CallbackDict
+
+
+class SQLiteSession(CallbackDict, SessionMixin):
+    """Session data plus the id it is stored under."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.cleared = False
+
+    def clear(self):
+        """Empty the session and have it saved under a fresh id."""
+        super().clear()
+        self.cleared = True
+
+
+class SQLiteSessionInterface(Database, SessionInterface):
+    """
+    Server-side sessions in a WAL SQLite database shared by every worker.
+
+    The cookie carries only a random session id. Reading a session is one primary
+    key lookup, and sessions are only written back when they change.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, path, timeout=5.0, purge_every=1000):
+        super().__init__(path, timeout)
+        self.purge_every = purge_every
+        self._saves = 0
+
+        # create the table at startup rather than on the first request
+        self._connect()
+
+    def _setup(self, conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL) WITHOUT ROWID")
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = self._connect().execute("SELECT data FROM sessions WHERE id=? AND expires>?", (sid, time.time())).fetchone()
+            if row is not None:
+                return SQLiteSession(self.serializer.loads(row[0]), sid=sid)
+
+        # never adopt an unknown id from the client, always issue a fresh one
+        return SQLiteSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        conn = self._connect()
+
+        # a cleared session, as on login and logout, never keeps its id, so an id
+        # planted on the client before login can't be carried into the logged in session
+        if session.cleared and not session.new:
+            conn.execute("DELETE FROM sessions WHERE id=?", (session.sid,))
+            session.sid = secrets.token_urlsafe(32)
+            if not session:
+                response.delete_cookie(name, domain=domain, path=path)
+                return
+
+        # emptied session is deleted along with its cookie
+        if not session:
+            if session.modified and not session.new:
+                conn.execute("DELETE FROM sessions WHERE id=?", (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.modified:
+            return
+
+        expires = time.time() + app.permanent_session_lifetime.total_seconds()
+        conn.execute("INSERT INTO sessions (id, data, expires) VALUES (?, ?, ?) ON CONFLICT (id) DO UPDATE SET data=excluded.data, expires=excluded.expires",
+                     (session.sid, self.serializer.dumps(dict(session)), expires))
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app),
+                            samesite=self.get_cookie_samesite(app))
+
+        # drop expired sessions now and then
+        self._saves += 1
+        if self._saves % self.purge_every == 0:
+            conn.execute("DELETE FROM sessions WHERE expires<=?", (time.time(),))
@@ -0,0 +1,173 @@
+from datetime import datetime
+from repository import Database
+
+
+class TradeError(Exception):
+    """A trade that can't be executed, with a message fit to show the user."""
+
+
+class TradeExecutor(Database):
+    """Execute trades against finance.db, each in a single BEGIN IMMEDIATE transaction."""
+
+    def __init__(self, path, timeout=5.0):
+        super().__init__(path, timeout)
+
+        # called with (user_id, positions version, applied legs) after each commit
+        self.listeners = []
+
+    def buy(self, user_id, symbol, shares, price):
+        """Buy shares of symbol at price, returning the transaction id."""
+        return self.execute(user_id, [(symbol, shares, price)])[0]
+
+    def sell(self, user_id, symbol, shares, price):
+        """Sell shares of symbol at price, returning the transaction id."""
+        return self.execute(user_id, [(symbol, -shares, price)])[0]
+
+    def execute(self, user_id, legs):
+        """
+        Apply (symbol, quantity, price) legs atomically, negative quantities selling.
+
+        Cash check and debit, ledger append and position update all happen in one
+        transaction, so either every leg is applied or none is. Raises TradeError
+        if the user lacks the cash or shares for any leg.
+        """
+        conn = self._connect()
+        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # take the write lock up front so no other worker can move cash or shares in between
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [self._apply(conn, user_id, symbol, quantity, price, date) for symbol, quantity, price in legs]
+            version = self._bump(conn, user_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify(user_id, version, legs)
+        return ids
+
+    def execute_batch(self, user_id, legs, atomic=True):
+        """
+        Apply a basket of (symbol, quantity, price) legs in one transaction.
+
+        Sells go before buys so their proceeds can fund the buys. If atomic, the
+        basket's total cash and holdings are checked up front and any failing leg
+        rejects the whole basket; otherwise each leg stands or falls on its own.
+        Returns a (transaction id, error message) pair per leg, in input order.
+        """
+        conn = self._connect()
+        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        results = [(None, None)] * len(legs)
+        order = sorted(range(len(legs)), key=lambda i: legs[i][1] > 0)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if atomic:
+                self._check_basket(conn, user_id, legs)
+            for i in order:
+                symbol, quantity, price = legs[i]
+                if atomic:
+                    results[i] = (self._apply(conn, user_id, symbol, quantity, price, date), None)
+                    continue
+
+                # a failing leg only undoes itself
+                conn.execute("SAVEPOINT leg")
+                try:
+                    results[i] = (self._apply(conn, user_id, symbol, quantity, price, date), None)
+                except TradeError as e:
+                    conn.execute("ROLLBACK TO leg")
+                    results[i] = (None, str(e))
+                conn.execute("RELEASE leg")
+            version = self._bump(conn, user_id)
+            conn.execute("COMMIT")
+        except TradeError as e:
+            conn.execute("ROLLBACK")
+            return [(None, str(e))] * len(legs)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify(user_id, version, [leg for leg, (id, _) in zip(legs, results) if id is not None])
+        return results
+
+    def fill(self, order_id, user_id, symbol, quantity, price):
+        """
+        Fill resting order order_id as one leg at price, returning its transaction id.
+
+        The order is claimed in the same transaction as the trade, so it fills at
+        most once however many workers see the quote crossing it; returns None if
+        it was already filled or cancelled. Raises TradeError, leaving the order
+        open, if the user lacks the cash or shares.
+        """
+        conn = self._connect()
+        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not conn.execute("UPDATE orders SET status='filled', closed=?, price=? WHERE id=? AND status='open'", (date, price, order_id)).rowcount:
+                conn.execute("ROLLBACK")
+                return None
+            id = self._apply(conn, user_id, symbol, quantity, price, date)
+            conn.execute("UPDATE orders SET transaction_id=? WHERE id=?", (id, order_id))
+            version = self._bump(conn, user_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify(user_id, version, [(symbol, quantity, price)])
+        return id
+
+    @staticmethod
+    def _bump(conn, user_id):
+        """Increment user's positions version inside the caller's transaction, returning it."""
+        conn.execute("UPDATE users SET positions_version=positions_version+1 WHERE id=?", (user_id,))
+        return conn.execute("SELECT positions_version FROM users WHERE id=?", (user_id,)).fetchone()[0]
+
+    def _notify(self, user_id, version, legs):
+        """Pass committed legs on to listeners."""
+        for listener in self.listeners:
+            listener(user_id, version, legs)
+
+    @staticmethod
+    def _check_basket(conn, user_id, legs):
+        """Raise TradeError unless user can afford every leg of the basket at once."""
+        cash = conn.execute("SELECT cash FROM users WHERE id=?", (user_id,)).fetchone()[0]
+        needed = sum(quantity * price for _, quantity, price in legs)
+        if needed > cash:
+            raise TradeError(f"basket needs {needed:,.2f} but only {cash:,.2f} cash is available")
+
+        # sells run first, so shares sold per symbol must not exceed what is already held
+        sold = {}
+        for symbol, quantity, _ in legs:
+            if quantity < 0:
+                sold[symbol] = sold.get(symbol, 0) - quantity
+        for symbol, shares in sold.items():
+            row = conn.execute("SELECT quantity FROM positions WHERE user_id=? AND symbol=?", (user_id, symbol)).fetchone()
+            if not row or row[0] < shares:
+                raise TradeError(f"You may not sell more {symbol} shares than you currently hold")
+
+    @staticmethod
+    def _apply(conn, user_id, symbol, quantity, price, date):
+        """Apply one leg inside the caller's transaction, returning its transaction id."""
+        cost = quantity * price
+
+        if quantity > 0:
+            # debit cash only if there is enough of it
+            if not conn.execute("UPDATE users SET cash=cash-? WHERE id=? AND cash>=?", (cost, user_id, cost)).rowcount:
+                raise TradeError("you do not have enough cash for this transaction")
+
+            # add shares to position, creating it if symbol is new
+            conn.execute("INSERT INTO positions (user_id, symbol, quantity) VALUES (?, ?, ?) ON CONFLICT (user_id, symbol) DO UPDATE SET quantity=quantity+excluded.quantity",
+                         (user_id, symbol, quantity))
+        else:
+            # remove shares only if enough are held
+            if not conn.execute("UPDATE positions SET quantity=quantity+? WHERE user_id=? AND symbol=? AND quantity>=?",
+                                (quantity, user_id, symbol, -quantity)).rowcount:
+                raise TradeError("You may not sell more shares than you currently hold")
+
+            # drop the position once it is sold out
+            conn.execute("DELETE FROM positions WHERE user_id=? AND symbol=? AND quantity=0", (user_id, symbol))
+            conn.execute("UPDATE users SET cash=cash-? WHERE id=?", (cost, user_id))
+
+        # add transaction to transaction database
+        return conn.execute("INSERT INTO transactions (user_id, stock, quantity, price, date) VALUES (?, ?, ?, ?, ?)",
+                            (user_id, symbol, quantity, price, date)).lastrowid
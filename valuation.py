@@ -0,0 +1,152 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class Snapshot:
+    """One user's valued holdings as of a positions version."""
+
+    def __init__(self, version):
+        self.version = version
+        self.positions = {}
+        self.priced_at = {}
+        self.total = 0.0
+
+    def set(self, symbol, quantity, price, now):
+        """
+        Set symbol's quantity and price, adjusting the grand total by the change in value.
+
+        A price of None leaves the holding unvalued and out of the total, and a
+        priced_at of now=None marks it stale so it is repriced on the next read.
+        """
+        old = self.positions.get(symbol)
+        if old is not None and old["total"] is not None:
+            self.total -= old["total"]
+        if quantity <= 0:
+            self.positions.pop(symbol, None)
+            self.priced_at.pop(symbol, None)
+            return
+        value = quantity * price if price is not None else None
+        self.positions[symbol] = {"stock": symbol, "quantity": quantity, "price": price, "total": value}
+        self.priced_at[symbol] = now if now is not None else float("-inf")
+        if value is not None:
+            self.total += value
+
+    def rows(self):
+        """Return positions as index() renders them, ordered by symbol."""
+        return [dict(self.positions[symbol]) for symbol in sorted(self.positions)]
+
+
+class ValuationCache:
+    """
+    Per-user portfolio valuations kept current by trades and quote updates.
+
+    A snapshot is only served for the positions version it was built at, so trades
+    made through another worker invalidate it; trades and quotes seen by this worker
+    adjust it in place.
+    """
+
+    def __init__(self, ttl=60, maxsize=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._snapshots = OrderedDict()
+        self._holders = {}
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        """Return user's snapshot if it is at version, else None."""
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is None:
+                return None
+            if snapshot.version != version:
+                self._drop(user_id)
+                return None
+            self._snapshots.move_to_end(user_id)
+            return snapshot
+
+    def build(self, user_id, version, positions, quotes):
+        """
+        Value (symbol, quantity) positions at quotes (symbol to price) and store the snapshot.
+
+        Symbols priced None, as when the provider is down, fall back to the last price
+        this cache saw, or else are left unvalued; either way they count as stale.
+        """
+        snapshot = Snapshot(version)
+        now = self.clock()
+        with self._lock:
+            for symbol, quantity in positions:
+                price = quotes.get(symbol)
+                if price is not None:
+                    self._last[symbol] = price
+                    snapshot.set(symbol, quantity, price, now)
+                else:
+                    snapshot.set(symbol, quantity, self._last.get(symbol), None)
+            self._drop(user_id)
+            self._snapshots[user_id] = snapshot
+            for symbol in snapshot.positions:
+                self._holders.setdefault(symbol, set()).add(user_id)
+            while len(self._snapshots) > self.maxsize:
+                self._drop(next(iter(self._snapshots)))
+        return snapshot
+
+    def read(self, snapshot):
+        """Return (rows, total) of snapshot as of one moment, copied so other threads can't change them underneath."""
+        with self._lock:
+            return snapshot.rows(), snapshot.total
+
+    def stale(self, snapshot):
+        """Return symbols in snapshot whose price is older than ttl."""
+        cutoff = self.clock() - self.ttl
+        with self._lock:
+            return [symbol for symbol, at in snapshot.priced_at.items() if at <= cutoff]
+
+    def apply_trades(self, user_id, version, legs):
+        """Trade listener: apply committed (symbol, quantity, price) legs that moved user to version."""
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is None:
+                return
+
+            # already built from positions read after this trade committed
+            if snapshot.version >= version:
+                return
+
+            # another worker traded in between, rebuild on next read
+            if snapshot.version != version - 1:
+                self._drop(user_id)
+                return
+
+            now = self.clock()
+            for symbol, quantity, price in legs:
+                self._last[symbol] = price
+                held = snapshot.positions.get(symbol, {"quantity": 0})["quantity"]
+                snapshot.set(symbol, held + quantity, price, now)
+                if symbol in snapshot.positions:
+                    self._holders.setdefault(symbol, set()).add(user_id)
+                else:
+                    self._holders.get(symbol, set()).discard(user_id)
+            snapshot.version = version
+
+    def update_quotes(self, quotes):
+        """Quote listener: reprice every snapshot holding a symbol in quotes."""
+        now = self.clock()
+        with self._lock:
+            for quote in quotes.values():
+                if quote is None:
+                    continue
+                symbol = quote["symbol"]
+                self._last[symbol] = quote["price"]
+                for user_id in self._holders.get(symbol, ()):
+                    snapshot = self._snapshots[user_id]
+                    snapshot.set(symbol, snapshot.positions[symbol]["quantity"], quote["price"], now)
+
+    def _drop(self, user_id):
+        """Forget user's snapshot; caller holds the lock."""
+        snapshot = self._snapshots.pop(user_id, None)
+        if snapshot is not None:
+            for symbol in snapshot.positions:
+                self._holders.get(symbol, set()).discard(user_id)